@@ -1,31 +1,331 @@
-from typing import Literal
+import codecs
+import json
+import logging
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Iterator, Literal
+from urllib.parse import urlsplit
 
 import requests
+from requests.adapters import HTTPAdapter
 import time
+from api.cache import HTTPCache
+from api.resilience import CircuitBreaker, CircuitOpenError, LatencyWindow, backoff_delay
 import logger
 
 
 log = logger.get_logger(__name__)
 
+IDEMPOTENT_METHODS = ('GET', 'PUT', 'DELETE')
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+@dataclass
+class BulkResult:
+    """
+    Result of a bulk call. results keep the order of the input items,
+    failed items have None in results and their exception in errors under the same index.
+    """
+    results: list = field(default_factory=list)
+    errors: dict = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+ITEM_DELIMITERS = ',] \t\r\n'
+
+
+def iter_json_array(chunks: Iterable[str]) -> Iterator:
+    """
+    Parse a JSON array incrementally and yield its items one by one.
+    Only the not yet parsed tail of the text is kept in memory.
+    :param chunks:iterable of text chunks, e.g. decoded response.iter_content()
+    :return: iterator over array items
+    """
+    decoder = json.JSONDecoder()
+    whitespace = re.compile(r'[\s,]*')  # separators between items are skipped together with whitespace
+    buffer = ''
+    started = False
+
+    for chunk in chunks:
+        buffer += chunk
+        pos = 0
+        while True:
+            pos = whitespace.match(buffer, pos).end() if started else len(buffer) - len(buffer.lstrip())
+            if pos == len(buffer):
+                break
+            if not started:
+                if buffer[pos] != '[':
+                    raise ValueError(f'JSON array expected, got: {buffer[pos:pos + 20]!r}')
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # the item is not complete yet, wait for the next chunk
+            if not isinstance(item, (dict, list)) and (end == len(buffer) or buffer[end] not in ITEM_DELIMITERS):
+                break  # a number or literal may continue in the next chunk, e.g. -35000000000. + 0
+            yield item
+            pos = end
+        buffer = buffer[pos:]
+
+    raise ValueError('Unexpected end of JSON array')
+
+
+@dataclass
+class RequestTiming:
+    method: str
+    url: str
+    template: str  # url path with ids replaced, e.g. /devices/{id}
+    status: int
+    nbytes: int
+    elapsed: float  # seconds
+    started: float  # unix time
+
 
 class RESTAPI:
     auth: tuple = None  # optional parameter to use http authentication
     headers: dict = None  # optional parameters to set http headers
+    recorder = None  # optional db.TimingRecorder to save request timings
+    cache: HTTPCache = None  # optional HTTP cache, GETs are revalidated with conditional requests
+    observers: tuple = ()  # callables taking RequestTiming of every request, e.g. the latency budget plugin
+    raise_for_status: bool = False  # raise requests.HTTPError on 4xx/5xx, bulk calls and raising() always do
 
-    def __init__(self, base_url: str, timeout: int = 30):
+    def __init__(self,
+                 base_url: str,
+                 timeout: int = 30,
+                 pool_connections: int = 10,
+                 pool_maxsize: int = 10,
+                 pool_block: bool = False,
+                 concurrency: int = 10,
+                 retries: int = 0,
+                 backoff: float = 0.1,
+                 backoff_max: float = 5,
+                 hedge: bool = False,
+                 hedge_after: float = None,
+                 breaker_threshold: int = 0,
+                 breaker_reset: float = 30):
+        """
+        :param base_url:str URL of the server app
+        :param timeout:int request timeout in seconds
+        :param pool_connections:int number of per-host connection pools to cache
+        :param pool_maxsize:int max number of keep-alive connections kept per host
+        :param pool_block:bool wait for a free connection instead of opening an extra one when the pool is exhausted
+        :param concurrency:int default number of worker threads used by bulk calls
+        :param retries:int retries of GET, PUT and DELETE on connection errors, timeouts and 429/5xx.
+                           POST is never retried.
+        :param backoff:float seconds, retry n sleeps a random time up to backoff * 2 ** n
+        :param backoff_max:float max sleep between retries in seconds
+        :param hedge:bool send a duplicate of a GET which is slower than p95 of the endpoint, the first response wins
+        :param hedge_after:float fixed hedging deadline in seconds instead of p95
+        :param breaker_threshold:int consecutive failures which open the circuit of a host, 0 disables the breaker
+        :param breaker_reset:float seconds the circuit stays open before a trial request
+        """
         self.base_url = base_url
         self.timeout = timeout
         self.elapsed_time = None
+        self.concurrency = int(concurrency)
+        self.retries = int(retries)
+        self.backoff = float(backoff)
+        self.backoff_max = float(backoff_max)
+        self.hedge = bool(hedge)
+        self.hedge_after = hedge_after
+        self.breaker_threshold = int(breaker_threshold)
+        self.breaker_reset = float(breaker_reset)
+        # retries, hedges, hedge_wins, breaker_opened, breaker_rejected, cache_hits
+        self.counters = Counter()
+        self._counters_lock = threading.Lock()
+        self._latency = LatencyWindow()
+        self._breakers = {}
+        self._hedge_executor = None
+        if self.hedge:
+            self._hedge_pool()  # created before the first bulk call, whose threads would race to create it
+
+        # one adapter (urllib3 pool manager) is shared by all threads, it is thread-safe and keeps connections alive.
+        # requests.Session itself is not guaranteed to be thread-safe, so every thread gets its own light session
+        # mounted on the same adapter.
+        self._adapter = HTTPAdapter(pool_connections=int(pool_connections),
+                                    pool_maxsize=int(pool_maxsize),
+                                    pool_block=bool(pool_block))
+        self._local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        """
+        Session of the current thread. Created on first use and mounted on the shared connection pool.
+        :return:
+        """
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount('http://', self._adapter)
+            session.mount('https://', self._adapter)
+            self._local.session = session
+
+        return session
+
+    def close(self):
+        """
+        Release pooled connections. Sessions hold nothing but the shared adapter, so closing it is enough.
+        :return:
+        """
+        self._local = threading.local()
+        self._adapter.close()
+        with self._counters_lock:
+            executor, self._hedge_executor = self._hedge_executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @contextmanager
+    def raising(self):
+        """
+        4xx/5xx responses raise requests.HTTPError in the current thread inside the block,
+        other threads keep raise_for_status.
+        """
+        previous = getattr(self._local, 'raising', False)
+        self._local.raising = True
+        try:
+            yield self
+        finally:
+            self._local.raising = previous
+
+    def _raising_call(self, func: Callable, item):
+        with self.raising():
+            return func(item)
+
+    def _bulk(self, func: Callable, items: Iterable, concurrency: int = None) -> BulkResult:
+        """
+        Call func for each item on a bounded thread pool.
+        An exception raised for one item does not stop the others, it is collected into BulkResult.errors.
+        A 4xx/5xx response is an error of its item as well, requests.HTTPError.
+        :param func:callable taking one item
+        :param items:iterable of items
+        :param concurrency:int max number of parallel calls, default is self.concurrency
+        :return:BulkResult with results in the order of items
+        """
+        items = list(items)
+        result = BulkResult(results=[None] * len(items))
+        if not items:
+            return result
+
+        workers = max(1, min(concurrency or self.concurrency, len(items)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bulk') as executor:
+            futures = [executor.submit(self._raising_call, func, item) for item in items]
+            for index, future in enumerate(futures):
+                try:
+                    result.results[index] = future.result()
+                except Exception as e:
+                    log.debug('Bulk item %s failed: %r', index, e)
+                    result.errors[index] = e
+
+        return result
+
+    @staticmethod
+    def _body_size(response: requests.Response, stream: bool) -> int:
+        """
+        Body size in bytes. A streamed body is not read here, Content-Length is used if the server sent it.
+        """
+        if not stream:
+            return len(response.content)
+        length = response.headers.get('Content-Length', '')
+        return int(length) if length.isdigit() else None
+
+    def url_template(self, url: str) -> str:
+        """
+        Returns url path with variable parts replaced, so timings of the same endpoint can be grouped.
+        Generic rule replaces path segments containing digits, override it for APIs with other id formats.
+        :param url:str
+        :return:
+        """
+        return '/'.join('{id}' if re.search(r'\d', segment) else segment
+                        for segment in urlsplit(url).path.split('/'))
+
+    def _count(self, counter: str):
+        with self._counters_lock:
+            self.counters[counter] += 1
+
+    def breaker(self, url: str) -> CircuitBreaker:
+        """
+        Circuit breaker of the host of url, None if the breaker is disabled.
+        """
+        if not self.breaker_threshold:
+            return None
+        host = urlsplit(url).netloc
+        with self._counters_lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(self.breaker_threshold, self.breaker_reset)
+            return self._breakers[host]
+
+    def _hedge_pool(self) -> ThreadPoolExecutor:
+        with self._counters_lock:
+            if self._hedge_executor is None:
+                self._hedge_executor = ThreadPoolExecutor(max_workers=max(4, 2 * self.concurrency),
+                                                          thread_name_prefix='hedge')
+            return self._hedge_executor
+
+    def _send(self, prepped_request: requests.PreparedRequest, stream: bool, template: str) -> requests.Response:
+        _start = time.time()
+        response = self.session.send(prepped_request, timeout=self.timeout, stream=stream)
+        if response.ok:
+            self._latency.add(template, time.time() - _start)
+        return response
+
+    def _send_hedged(self, prepped_request: requests.PreparedRequest, stream: bool, template: str):
+        """
+        Send the request, and a duplicate if there is no response by the deadline. The first response wins,
+        the other one is closed when it arrives.
+        """
+        deadline = self.hedge_after or self._latency.percentile(template)
+        if deadline is None:
+            return self._send(prepped_request, stream, template)  # not enough samples to know what is slow
+
+        executor = self._hedge_pool()
+        primary = executor.submit(self._send, prepped_request, stream, template)
+        done, _ = wait([primary], timeout=deadline)
+        if done:
+            return primary.result()
+
+        self._count('hedges')
+        log.debug('Hedging %s %s after %.3fs', prepped_request.method, prepped_request.url, deadline)
+        pending = {primary, executor.submit(self._send, prepped_request.copy(), stream, template)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winner = next((f for f in done if f.exception() is None), None)
+            if winner is not None:
+                for loser in pending | done - {winner}:
+                    loser.add_done_callback(lambda f: f.exception() is None and f.result().close())
+                if winner is not primary:
+                    self._count('hedge_wins')
+                return winner.result()
+        return primary.result()  # both failed, raise the error of the original request
 
     def _request(self,
                  url: str,
                  method: Literal['GET', 'POST', 'PUT', 'DELETE'],
-                 payload: object) -> requests.Response:
+                 payload: object,
+                 stream: bool = False) -> requests.Response:
         """
         Generic method to call requests.Request
         :param url:str URL to send
         :param method:str allowed methods:['GET', 'POST', 'PUT', 'DELETE']
         :param payload:dict will be passed as 'params' for GET and DELETE, as 'data' for PUT and POST requests
+        :param stream:bool do not read the body, the caller consumes and closes the response.
+                           elapsed_time is time to response headers then.
         :return:
         """
 
@@ -35,27 +335,109 @@ class RESTAPI:
         request_params = {'params': payload} if method in ['GET', 'DELETE'] else {'data': payload}
 
         request = requests.Request(url=url, method=method, **request_params, auth=self.auth, headers=self.headers)
-        log.debug(f'url: {url}')
-        prepped_request = request.prepare()
-        session = requests.Session()
+        log.debug('url: %s', url)
+        prepped_request = self.session.prepare_request(request)
+        template = self.url_template(url)
+        breaker = self.breaker(url)
+        attempts = 1 + (self.retries if method in IDEMPOTENT_METHODS else 0)
 
-        _start = time.time()
-        response = session.send(prepped_request, timeout=self.timeout)
+        cached = None
+        if self.cache is not None and method == 'GET' and not stream:
+            cached = self.cache.get(prepped_request.url)
+            if cached is not None:
+                prepped_request.headers.update(self.cache.validators(cached))
+
+        _start = time.time()  # elapsed_time includes retries and backoff, it is what the caller waits for
+        for attempt in range(attempts):
+            if breaker is not None and not breaker.allow():
+                self._count('breaker_rejected')
+                raise CircuitOpenError(f'Circuit of {urlsplit(url).netloc} is open after {breaker.failures} failures')
+
+            try:
+                if self.hedge and method == 'GET':
+                    response = self._send_hedged(prepped_request, stream, template)
+                else:
+                    response = self._send(prepped_request, stream, template)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                failed, response = e, None
+            except BaseException:
+                if breaker is not None:
+                    breaker.release()  # e.g. ChunkedEncodingError of the trial must not keep the circuit open
+                raise
+            else:
+                failed = response.status_code >= 500 or response.status_code == 429
+
+            if breaker is not None:
+                if not failed:
+                    breaker.success()
+                elif breaker.failure():
+                    self._count('breaker_opened')
+                    log.warning('Circuit of %s is open', urlsplit(url).netloc)
+
+            retry = attempt + 1 < attempts and (response is None or response.status_code in RETRY_STATUSES)
+            if not retry:
+                if response is None:
+                    raise failed
+                break
+
+            self._count('retries')
+            delay = backoff_delay(attempt, self.backoff, self.backoff_max)
+            log.debug('Retry %s of %s %s in %.3fs: %r', attempt + 1, method, url, delay,
+                      failed if response is None else response.status_code)
+            if response is not None:
+                response.close()
+            time.sleep(delay)
         self.elapsed_time = time.time() - _start
 
-        log.debug(f'Status code returned: {response.status_code}')
-        session.close()
+        log.debug('Status code returned: %s', response.status_code)
+        log.debug('elapsed time: %s', self.elapsed_time)
 
-        # here you can save request execution time to a database to see how requests performance behave in time
-        log.debug(f'elapsed time: {self.elapsed_time}')
+        if self.recorder is not None or self.observers:
+            timing = RequestTiming(method=method,
+                                   url=response.url,
+                                   template=template,
+                                   status=response.status_code,
+                                   nbytes=self._body_size(response, stream),
+                                   elapsed=self.elapsed_time,
+                                   started=_start)
+            if self.recorder is not None:
+                self.recorder.record(timing)
+            for observer in self.observers:
+                observer(timing)
 
-        try:
-            log.debug(f'json result if json exists: {response.json()}')
-        except Exception as e:
-            log.exception(e)
+        if self.cache is not None and not stream:
+            if method != 'GET':
+                self.cache.invalidate(url)
+            elif cached is not None and response.status_code == 304:
+                self._count('cache_hits')
+                response = self.cache.revalidated(cached, response)
+            else:
+                self.cache.store(response)
+
+        # the body is decoded for the log only when DEBUG is on, callers parse it themselves
+        if not stream and log.isEnabledFor(logging.DEBUG):
+            log.debug('response body: %s', response.text)
+
+        if (self.raise_for_status or getattr(self._local, 'raising', False)) and not response.ok:
+            response.close()  # release the connection of a streamed response before raising
+            response.raise_for_status()
 
         return response
 
+    def iter_json(self, url: str, payload=None, chunk_size: int = 64 * 1024) -> Iterator:
+        """
+        GET url which returns a JSON array and yield array items while the body is still being received.
+        :param url:str
+        :param payload:dict query parameters
+        :param chunk_size:int bytes read from the socket at once
+        :return: iterator over array items
+        """
+        with self._request(url, method='GET', payload=payload, stream=True) as response:
+            response.raise_for_status()
+            decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+            chunks = (decoder.decode(chunk) for chunk in response.iter_content(chunk_size=chunk_size))
+            yield from iter_json_array(chunks)
+
     def get(self, url: str, payload=None) -> requests.Response:
         return self._request(url, method='GET', payload=payload)
 
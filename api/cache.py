@@ -0,0 +1,191 @@
+"""
+Client-side HTTP cache of RESTAPI GET responses, revalidated with conditional requests.
+
+    api.cache = HTTPCache(maxsize=256, path='testresults/http-cache.sqlite')
+
+A cached response is sent again with If-None-Match / If-Modified-Since, an unchanged resource costs
+a 304 without body and the stored body is returned to the caller.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY,
+    headers TEXT NOT NULL,
+    content BLOB NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_used ON responses (used);
+'''
+
+# describe the stored body as sent on the wire, it is kept decoded
+_DROPPED_HEADERS = ('Content-Encoding', 'Content-Length', 'Transfer-Encoding', 'Connection', 'Keep-Alive')
+
+
+class HTTPCache:
+    """
+    Bounded LRU of response bodies with their validators (ETag, Last-Modified), optionally persisted to SQLite
+    so the next run starts warm. Only responses with a validator are stored.
+    """
+
+    def __init__(self, maxsize: int = 256, path: str = None):
+        """
+        :param maxsize:int max number of responses kept in memory and on disk
+        :param path:str SQLite file to persist responses to, memory only if empty
+        """
+        self.maxsize = int(maxsize)
+        self.path = path
+        self._entries = OrderedDict()  # url -> (headers, content)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._rows = 0  # rows on disk, other processes sharing the file make it approximate
+
+        if path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with self._connect() as connection:
+                connection.executescript(SCHEMA)
+                self._rows = connection.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Connection of the current thread, opened on first use and kept, bulk sweeps call this for every request.
+        It is closed when the thread ends.
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(self.path, timeout=30)
+        return connection
+
+    def get(self, url: str) -> tuple:
+        """
+        :return: (headers, content) of the stored response, None if there is none
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+                return entry
+
+        if not self.path:
+            return None
+        with self._connect() as connection:
+            row = connection.execute('SELECT headers, content FROM responses WHERE url = ?', (url,)).fetchone()
+            if row is None:
+                return None
+            connection.execute('UPDATE responses SET used = ? WHERE url = ?', (time.time(), url))
+        entry = (json.loads(row[0]), row[1])
+        self._remember(url, entry)
+        return entry
+
+    @staticmethod
+    def validators(entry: tuple) -> dict:
+        """
+        Conditional request headers for the stored response.
+        """
+        headers = CaseInsensitiveDict(entry[0])
+        conditions = {}
+        if 'ETag' in headers:
+            conditions['If-None-Match'] = headers['ETag']
+        if 'Last-Modified' in headers:
+            conditions['If-Modified-Since'] = headers['Last-Modified']
+        return conditions
+
+    def store(self, response: requests.Response):
+        """
+        Keep the body of a 200 response which has a validator.
+        """
+        if response.status_code != 200 or not ('ETag' in response.headers or 'Last-Modified' in response.headers):
+            return
+        headers = {k: v for k, v in response.headers.items() if k not in _DROPPED_HEADERS}
+        entry = (headers, response.content)
+        self._remember(response.url, entry)
+
+        if self.path:
+            with self._connect() as connection:
+                stored = connection.execute('SELECT 1 FROM responses WHERE url = ?', (response.url,)).fetchone()
+                connection.execute('INSERT OR REPLACE INTO responses (url, headers, content, used) VALUES (?, ?, ?, ?)',
+                                   (response.url, json.dumps(headers), response.content, time.time()))
+                with self._lock:
+                    self._rows += stored is None
+                    evict = self._rows > self.maxsize
+                if evict:
+                    # the least recently used tenth goes at once, so eviction does not run on every store
+                    connection.execute('DELETE FROM responses WHERE url IN '
+                                       '(SELECT url FROM responses ORDER BY used LIMIT ?)',
+                                       (self._rows - self.maxsize + max(1, self.maxsize // 10),))
+                    rows = connection.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+                    with self._lock:
+                        self._rows = rows
+
+    def _remember(self, url: str, entry: tuple):
+        with self._lock:
+            self._entries[url] = entry
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def revalidated(entry: tuple, not_modified: requests.Response) -> requests.Response:
+        """
+        Response with the stored body for a 304 answer to a conditional request.
+        """
+        headers, content = entry
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.headers = CaseInsensitiveDict(headers)
+        response.headers.update({k: v for k, v in not_modified.headers.items() if k not in _DROPPED_HEADERS})
+        response._content = content
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = not_modified.url
+        response.request = not_modified.request
+        response.elapsed = not_modified.elapsed
+        response.connection = not_modified.connection
+        response.from_cache = True
+        return response
+
+    @staticmethod
+    def _resource(url: str) -> tuple:
+        scheme, netloc, path, _, _ = urlsplit(url)
+        return scheme, netloc, path.rstrip('/')
+
+    def invalidate(self, url: str):
+        """
+        Forget the resource of url and the collection it belongs to, e.g. PUT /devices/1 invalidates
+        GET /devices/1 and GET /devices with any query.
+        """
+        scheme, netloc, path = self._resource(url)
+        affected = {(scheme, netloc, path), (scheme, netloc, path.rsplit('/', 1)[0])}
+
+        with self._lock:
+            for cached_url in [u for u in self._entries if self._resource(u) in affected]:
+                del self._entries[cached_url]
+
+        if self.path:
+            with self._connect() as connection:
+                urls = [u for (u,) in connection.execute('SELECT url FROM responses') if self._resource(u) in affected]
+                connection.executemany('DELETE FROM responses WHERE url = ?', [(u,) for u in urls])
+            with self._lock:
+                self._rows = max(0, self._rows - len(urls))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.path:
+            with self._connect() as connection:
+                connection.execute('DELETE FROM responses')
+            with self._lock:
+                self._rows = 0
+
+    def __len__(self):
+        return len(self._entries)
@@ -1,5 +1,10 @@
+import re
 from dataclasses import dataclass
-from api import RESTAPI
+from typing import Iterator
+
+from api import RESTAPI, BulkResult
+from api.index import DeviceIndex
+from api.namespace import Namespace
 import logger
 
 log = logger.get_logger(__name__)
@@ -14,6 +19,12 @@ class Device:
 
 
 class DevicesAPI(RESTAPI):
+    index: DeviceIndex = None  # optional client-side cache for lookups by id and name
+    namespace: Namespace = Namespace()  # lists show only devices of the namespace, the whole backend by default
+
+    def url_template(self, url: str) -> str:
+        # device ids are random strings, so anything after devices/ is an id
+        return re.sub(r'/devices/[^/?#]+', '/devices/{id}', super().url_template(url))
 
     def check_alive(self):
         return self.get(self.base_url)
@@ -21,60 +32,135 @@ class DevicesAPI(RESTAPI):
     def get_devices(self) -> list:
         log.debug('Get all devices list')
 
-        return self.get(self.base_url + 'devices').json()
+        devices = self.namespace.filter(self.get(self.base_url + 'devices').json())
+        if self.index is not None:
+            self.index.load(devices)
+
+        return devices
+
+    def iter_devices(self) -> Iterator[Device]:
+        """
+        Yield devices while the list is being downloaded, memory does not grow with the number of devices.
+        :return: iterator over Device
+        """
+        log.debug('Stream all devices list')
+
+        for device in self.iter_json(self.base_url + 'devices'):
+            if self.namespace.owns(device):
+                yield Device(**device)
 
     def get_device_by_name(self, name: str) -> list:
         """
         Get the list of devices and returns a list with the ones which match name.
         It is not clear if system_name is unique system-wide, good guess it is not unique.
+        With index the cached list is used. A miss is always checked with the server,
+        devices can be created bypassing this client, e.g. via UI.
         :param name:
         :return:
         """
+        if self.index is not None:
+            cached = self.index.find_by_name(name)
+            if cached:
+                return cached
+
         devices = self.get_devices()
         return [d for d in devices if d['system_name'] == name]
 
     def get_device_by_id(self, device_id: str) -> dict:
-        log.debug(f'Get device by id: {device_id}')
+        log.debug('Get device by id: %s', device_id)
+
+        if self.index is not None:
+            cached = self.index.get(device_id)
+            if cached is not None:
+                return cached
+
+        device = self.get(self.base_url + 'devices' + f'/{device_id}').json()
+        if self.index is not None and isinstance(device, dict):
+            self.index.put(device)
 
-        return self.get(self.base_url + 'devices' + f'/{device_id}').json()
+        return device
 
     def add_device(self, device: Device):
-        log.debug(f'Add device: {device}')
+        log.debug('Add device: %s', device)
 
-        return self.post(url=self.base_url + 'devices', payload=device.__dict__).json()
+        response = self.post(url=self.base_url + 'devices', payload=device.__dict__)
+        added = response.json()
+        if self.index is not None and response.ok and isinstance(added, dict):
+            self.index.put(added)
+
+        return added
 
     def update_device(self, device: Device):
-        log.debug(f'Update device: {device}')
+        log.debug('Update device: %s', device)
+
+        response = self.put(url=self.base_url + 'devices' + '/' + device.id, payload=device.__dict__)
+        if self.index is not None and response.ok:  # the index must not show a change the server refused
+            self.index.put(device.__dict__)
 
-        return self.put(url=self.base_url + 'devices' + '/' + device.id, payload=device.__dict__).json()
+        return response.json()
 
     def delete_device(self, device_id: str):
-        log.debug(f'Delete device by id: {device_id}')
+        log.debug('Delete device by id: %s', device_id)
+
+        response = self.delete(self.base_url + 'devices' + f'/{device_id}')
+        if self.index is not None and response.ok:
+            self.index.remove(device_id)
+
+        return response.json()
+
+    def get_devices_by_ids(self, device_ids: list, concurrency: int = None) -> BulkResult:
+        """
+        Get devices by id concurrently.
+        :param device_ids:list of device ids
+        :param concurrency:int max number of parallel requests, default is self.concurrency
+        :return:BulkResult with device dictionaries in the order of device_ids
+        """
+        log.debug('Get %s devices by id', len(device_ids))
+
+        return self._bulk(self.get_device_by_id, device_ids, concurrency)
+
+    def add_devices(self, devices: list, concurrency: int = None) -> BulkResult:
+        """
+        Add devices concurrently.
+        :param devices:list of Device
+        :param concurrency:int max number of parallel requests, default is self.concurrency
+        :return:BulkResult with added device dictionaries in the order of devices
+        """
+        log.debug('Add %s devices', len(devices))
+
+        return self._bulk(self.add_device, devices, concurrency)
+
+    def delete_devices(self, device_ids: list, concurrency: int = None) -> BulkResult:
+        """
+        Delete devices by id concurrently.
+        :param device_ids:list of device ids
+        :param concurrency:int max number of parallel requests, default is self.concurrency
+        :return:BulkResult with delete results in the order of device_ids
+        """
+        log.debug('Delete %s devices', len(device_ids))
 
-        return self.delete(self.base_url + 'devices' + f'/{device_id}').json()
+        return self._bulk(self.delete_device, device_ids, concurrency)
 
 
 if __name__ == '__main__':
-    devices_api = DevicesAPI(base_url='http://localhost:3000/')
-    log.info(devices_api.check_alive().json()['response'])
+    with DevicesAPI(base_url='http://localhost:3000/') as devices_api:
+        log.info(devices_api.check_alive().json()['response'])
 
-    # list devices
-    for api_device in devices_api.get_devices():
-        devices_api.get_device_by_id(api_device['id'])
+        # list devices
+        devices_api.get_devices_by_ids([d['id'] for d in devices_api.get_devices()])
 
-    # add device
-    new_device = Device(system_name='pySystem', type='pyType', hdd_capacity='import this')
-    added_device = Device(**devices_api.add_device(new_device))
-    log.info(f'added device: {added_device}')
+        # add device
+        new_device = Device(system_name='pySystem', type='pyType', hdd_capacity='import this')
+        added_device = Device(**devices_api.add_device(new_device))
+        log.info('added device: %s', added_device)
 
-    added_device.system_name = 'SUPPA PYTHON'
-    devices_api.update_device(added_device)
+        added_device.system_name = 'SUPPA PYTHON'
+        devices_api.update_device(added_device)
 
-    _device = devices_api.get_device_by_id(added_device.id)
-    log.info(f'Device: {_device}')
+        _device = devices_api.get_device_by_id(added_device.id)
+        log.info('Device: %s', _device)
 
-    r = devices_api.delete_device(added_device.id)
-    log.info(f'Delete result: {r}')
+        r = devices_api.delete_device(added_device.id)
+        log.info('Delete result: %s', r)
 
-    for api_device in devices_api.get_devices():
-        devices_api.get_device_by_id(api_device['id'])
+        devices_api.get_devices_by_ids([d['id'] for d in devices_api.get_devices()])
@@ -0,0 +1,294 @@
+"""
+In-process stand-in for the devices server app, stdlib only.
+
+python -m api.fake_server --port 3000 --devices 10000 --latency 20 --jitter 10 --error-rate 0.01
+
+or from python:
+
+with FakeDevicesServer(devices=1000, latency=5) as server:
+    api = DevicesAPI(base_url=server.base_url)
+"""
+import gzip
+import json
+import random
+import string
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from testdata import device_props
+import logger
+
+log = logger.get_logger(__name__, 'INFO')
+
+GZIP_MIN_SIZE = 1024  # bytes, smaller bodies are sent as is
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, so client connection pooling can be measured
+    disable_nagle_algorithm = True  # headers and body are separate writes, avoid delayed ACK stalls
+    server: '_Server'
+
+    def setup(self):
+        super().setup()
+        self.server.fake.count('connections')
+
+    def log_message(self, format, *args):
+        log.debug('%s - %s', self.address_string(), format % args)
+
+    def _send(self, status: int, body=None, etag: str = None):
+        if etag is not None and etag in [t.strip() for t in self.headers.get('If-None-Match', '').split(',')]:
+            self.server.fake.count('not_modified')
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            return
+
+        data = json.dumps(body).encode() if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        if len(data) >= GZIP_MIN_SIZE and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            data = gzip.compress(data, compresslevel=5)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Vary', 'Accept-Encoding')
+        if etag is not None:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self) -> dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length).decode() if length else ''
+        if self.headers.get('Content-Type', '').startswith('application/json'):
+            return json.loads(raw or '{}')
+        return dict(parse_qsl(raw))
+
+    def _handle(self, method: str):
+        fake = self.server.fake
+        fake.count('requests')
+        path = urlsplit(self.path).path.rstrip('/')
+        parts = [p for p in path.split('/') if p]
+        body = self._body() if method in ('POST', 'PUT') else None
+
+        fake.delay()
+        if fake.fail():
+            fake.count('errors')
+            return self._send(500, {'error': 'injected failure'})
+
+        if not parts:
+            return self._send(200, {'response': 'alive'}) if method == 'GET' else self._send(405)
+        if parts[0] != 'devices' or len(parts) > 2:
+            return self._send(404, {'error': 'not found'})
+
+        device_id = parts[1] if len(parts) == 2 else None
+        if device_id is None:
+            if method == 'GET':
+                etag = fake.etag()  # taken before the body, so it is never newer than the body
+                return self._send(200, fake.list_devices(), etag)
+            if method == 'POST':
+                return self._send(200, fake.add_device(body))
+            return self._send(405)
+
+        if method == 'GET':
+            etag = fake.etag(device_id)
+            device = fake.get_device(device_id)
+            return self._send(200, device, etag) if device is not None else self._send(404, {'error': 'not found'})
+        if method == 'PUT':
+            device = fake.update_device(device_id, body)
+        elif method == 'DELETE':
+            device = fake.delete_device(device_id)
+        else:
+            return self._send(405)
+        return self._send(200, device) if device is not None else self._send(404, {'error': 'not found'})
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', '*')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    fake: 'FakeDevicesServer'
+
+
+class FakeDevicesServer:
+    """
+    Fake of the devices REST API used by DevicesAPI: list, get, add, update and delete devices.
+    Latency, jitter and failures are injected from a seeded random generator, so runs are repeatable.
+    """
+
+    def __init__(self,
+                 host: str = '127.0.0.1',
+                 port: int = 0,
+                 devices: int = 10,
+                 latency: float = 0,
+                 jitter: float = 0,
+                 error_rate: float = 0,
+                 seed: int = 0):
+        """
+        :param host:str interface to listen on
+        :param port:int port to listen on, 0 picks a free one
+        :param devices:int number of devices generated at start
+        :param latency:float mean artificial latency of every response, ms
+        :param jitter:float max random deviation added to latency, ms
+        :param error_rate:float 0..1 share of requests answered with 500
+        :param seed:int seed for generated devices, ids, latency and failures
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.counters = {'connections': 0, 'requests': 0, 'errors': 0, 'not_modified': 0}
+
+        self._lock = threading.Lock()
+        self._devices = {}  # insertion ordered like the real server list
+        self._version = 0  # incremented by every change, ETag of the list
+        self._versions = {}  # device id -> version of its last change, ETag of the device
+        for _ in range(devices):
+            self._store({'system_name': f'{self.random.choice(device_props.first_names).upper()}-'
+                                        f'{self.random.choice(device_props.size_matters).upper()}',
+                         'type': self.random.choice(device_props.device_types),
+                         'hdd_capacity': str(2 ** self.random.randint(7, 12))})
+
+        self._server = None
+        self._thread = None
+
+    def _new_id(self) -> str:
+        while True:
+            device_id = ''.join(self.random.choices(string.ascii_letters + string.digits, k=9))
+            if device_id not in self._devices:
+                return device_id
+
+    def _store(self, fields: dict, device_id: str = None) -> dict:
+        device = {'id': device_id or self._new_id(),
+                  'system_name': fields.get('system_name'),
+                  'type': fields.get('type'),
+                  'hdd_capacity': fields.get('hdd_capacity')}
+        self._devices[device['id']] = device
+        self._version += 1
+        self._versions[device['id']] = self._version
+        return dict(device)
+
+    def count(self, counter: str):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def delay(self):
+        if not self.latency and not self.jitter:
+            return
+        with self._lock:
+            seconds = (self.latency + self.random.uniform(-self.jitter, self.jitter)) / 1000
+        time.sleep(max(0.0, seconds))
+
+    def fail(self) -> bool:
+        if not self.error_rate:
+            return False
+        with self._lock:
+            return self.random.random() < self.error_rate
+
+    def list_devices(self) -> list:
+        with self._lock:
+            return [dict(d) for d in self._devices.values()]
+
+    def get_device(self, device_id: str) -> dict:
+        with self._lock:
+            device = self._devices.get(device_id)
+            return dict(device) if device else None
+
+    def add_device(self, fields: dict) -> dict:
+        with self._lock:
+            return self._store(fields)
+
+    def update_device(self, device_id: str, fields: dict) -> dict:
+        with self._lock:
+            if device_id not in self._devices:
+                return None
+            return self._store(fields, device_id)
+
+    def delete_device(self, device_id: str) -> dict:
+        with self._lock:
+            device = self._devices.pop(device_id, None)
+            if device is not None:
+                self._version += 1
+                del self._versions[device_id]
+            return device
+
+    def etag(self, device_id: str = None) -> str:
+        """
+        ETag of the devices list or of one device
+        """
+        with self._lock:
+            if device_id is None:
+                return f'"{self._version}"'
+            return f'"{device_id}-{self._versions.get(device_id, 0)}"'
+
+    @property
+    def base_url(self) -> str:
+        return f'http://{self.host}:{self.port}/'
+
+    def start(self):
+        self._server = _Server((self.host, self.port), _Handler)
+        self._server.fake = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-devices-server', daemon=True)
+        self._thread.start()
+        log.info('Fake devices server with %s devices is listening on %s', len(self._devices), self.base_url)
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+if __name__ == '__main__':
+    import config
+
+    parser = config.parser
+    parser.add_argument('--host', default='127.0.0.1', help='default: %(default)s')
+    parser.add_argument('--port', type=int, default=3000, help='default: %(default)s')
+    parser.add_argument('--devices', type=int, default=10, help='number of generated devices. default: %(default)s')
+    parser.add_argument('--latency', type=float, default=0, help='mean response latency, ms. default: %(default)s')
+    parser.add_argument('--jitter', type=float, default=0, help='max latency deviation, ms. default: %(default)s')
+    parser.add_argument('--error-rate', type=float, default=0, help='share of 500 responses. default: %(default)s')
+    parser.add_argument('--seed', type=int, default=0, help='default: %(default)s')
+    cfg, _ = parser.parse_known_args()
+    logger.configure(default_level=cfg.log_level, levels=cfg.log_levels, json_file=cfg.log_json_file)
+
+    fake_server = FakeDevicesServer(host=cfg.host, port=cfg.port, devices=cfg.devices, latency=cfg.latency,
+                                    jitter=cfg.jitter, error_rate=cfg.error_rate, seed=cfg.seed).start()
+    try:
+        fake_server._thread.join()
+    except KeyboardInterrupt:
+        fake_server.stop()
@@ -0,0 +1,107 @@
+import threading
+import time
+
+import logger
+
+log = logger.get_logger(__name__)
+
+
+class DeviceIndex:
+    """
+    Client-side cache of devices with O(1) lookups by id and by system_name.
+    system_name is not unique, so the name index maps a name to all ids having it.
+    Entries expire after ttl seconds. Lookups return copies, callers are free to modify them.
+    """
+
+    def __init__(self, ttl: float = 60):
+        """
+        :param ttl:float seconds an entry and a loaded full list stay valid
+        """
+        self.ttl = ttl
+        self._by_id = {}  # id -> (device dict, stored at)
+        self._by_name = {}  # system_name -> {id: None}, dict is used as an ordered set
+        self._loaded_at = None
+        self._lock = threading.RLock()
+
+    def _expired(self, stored_at: float) -> bool:
+        return time.monotonic() - stored_at > self.ttl
+
+    def _unlink(self, device_id: str):
+        device, _ = self._by_id.pop(device_id, (None, None))
+        if device is not None:
+            ids = self._by_name.get(device.get('system_name'))
+            if ids is not None:
+                ids.pop(device_id, None)
+                if not ids:
+                    del self._by_name[device.get('system_name')]
+
+    def load(self, devices: list):
+        """
+        Replace the index content with the full list of devices.
+        :param devices:list of device dictionaries
+        :return:
+        """
+        with self._lock:
+            self._by_id.clear()
+            self._by_name.clear()
+            for device in devices:
+                self.put(device)
+            self._loaded_at = time.monotonic()
+
+    @property
+    def complete(self) -> bool:
+        """
+        True if the index holds a full list of devices which is not expired yet.
+        """
+        return self._loaded_at is not None and not self._expired(self._loaded_at)
+
+    def put(self, device: dict):
+        """
+        Add or replace a device.
+        :param device:dict with id
+        :return:
+        """
+        if not device or device.get('id') is None:
+            return
+        with self._lock:
+            self._unlink(device['id'])
+            self._by_id[device['id']] = (dict(device), time.monotonic())
+            self._by_name.setdefault(device.get('system_name'), {})[device['id']] = None
+
+    def remove(self, device_id: str):
+        with self._lock:
+            self._unlink(device_id)
+
+    def get(self, device_id: str) -> dict:
+        """
+        :param device_id:str
+        :return: copy of the device dictionary or None if it is not cached or expired
+        """
+        with self._lock:
+            device, stored_at = self._by_id.get(device_id, (None, None))
+            if device is None:
+                return None
+            if self._expired(stored_at):
+                self._unlink(device_id)
+                return None
+            return dict(device)
+
+    def find_by_name(self, name: str) -> list:
+        """
+        :param name:str system_name
+        :return: list of device copies, None if the index is not complete so the answer is unknown
+        """
+        with self._lock:
+            if not self.complete:
+                return None
+            devices = [self.get(device_id) for device_id in list(self._by_name.get(name, {}))]
+            return [d for d in devices if d is not None]
+
+    def clear(self):
+        with self._lock:
+            self._by_id.clear()
+            self._by_name.clear()
+            self._loaded_at = None
+
+    def __len__(self):
+        return len(self._by_id)
@@ -0,0 +1,309 @@
+"""
+Open-loop load generator for the devices API.
+
+python -m api.load --api-url http://localhost:3000/ --rate 50 --ramp-up 30 --duration 120 --mix get=60,list=5,add=15,update=10,delete=10
+
+Requests are started on a fixed schedule no matter how fast the server answers, latency is measured from the
+scheduled start, so a slow server shows up as growing latency instead of a silently lower request rate.
+"""
+import bisect
+import json
+import math
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from api.devices import DevicesAPI, Device
+from testdata import device_props
+import logger
+
+log = logger.get_logger(__name__, 'INFO')
+
+OPERATIONS = ('list', 'get', 'add', 'update', 'delete')
+
+
+class LatencyHistogram:
+    """
+    Log-linear latency histogram, 20 buckets per decade from 0.1 ms to 100 s, error is below 12%.
+    """
+    bounds = [10 ** (i / 20) / 10000 for i in range(121)]  # seconds
+
+    def __init__(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, pct: float) -> float:
+        """
+        Upper bound of the bucket holding the percentile, seconds.
+        """
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(pct * self.count / 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {'count': self.count,
+                'mean_ms': self.total / self.count * 1000 if self.count else None,
+                'max_ms': self.max * 1000,
+                **{f'p{p}_ms': self.percentile(p) * 1000 if self.count else None for p in (50, 90, 95, 99, 99.9)},
+                'buckets_ms': {f'{self.bounds[i] * 1000:.4g}' if i < len(self.bounds) else 'inf': c
+                               for i, c in enumerate(self.counts) if c}}
+
+
+class PhaseStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.started = None
+        self.finished = None
+        self.latency = {op: LatencyHistogram() for op in OPERATIONS}  # from scheduled start
+        self.service = {op: LatencyHistogram() for op in OPERATIONS}  # from actual start
+        self.errors = {op: 0 for op in OPERATIONS}
+        self.lock = threading.Lock()
+
+    def record(self, op: str, latency: float, service: float, error: bool):
+        with self.lock:
+            self.latency[op].record(latency)
+            self.service[op].record(service)
+            self.errors[op] += error
+
+    def to_dict(self) -> dict:
+        duration = (self.finished or time.monotonic()) - (self.started or time.monotonic())
+        total = sum(h.count for h in self.latency.values())
+        errors = sum(self.errors.values())
+        return {'phase': self.name,
+                'duration_s': duration,
+                'requests': total,
+                'throughput_rps': total / duration if duration > 0 else None,
+                'error_rate': errors / total if total else None,
+                'operations': {op: {'errors': self.errors[op],
+                                    'latency': self.latency[op].to_dict(),
+                                    'service_time': self.service[op].to_dict()}
+                               for op in OPERATIONS if self.latency[op].count}}
+
+
+def parse_mix(mix: str) -> dict:
+    """
+    :param mix:str like 'get=60,list=5,add=15,update=10,delete=10'
+    :return: dict operation -> weight
+    """
+    weights = {}
+    for item in mix.split(','):
+        op, _, weight = item.partition('=')
+        op = op.strip()
+        if op not in OPERATIONS:
+            raise AttributeError(f'Operation {op} is not supported, use one of {OPERATIONS}.')
+        weights[op] = float(weight)
+    return weights
+
+
+class LoadGenerator:
+    def __init__(self,
+                 api: DevicesAPI,
+                 rate: float,
+                 ramp_up: float,
+                 duration: float,
+                 mix: dict,
+                 workers: int = 100,
+                 seed: int = None):
+        """
+        :param api:DevicesAPI, 4xx/5xx responses of the operations count as errors of the run
+        :param rate:float target requests per second in steady state
+        :param ramp_up:float seconds to grow the rate linearly from 0 to rate
+        :param duration:float seconds of steady state
+        :param mix:dict operation -> weight
+        :param workers:int max requests in flight
+        :param seed:int random seed for a repeatable sequence of operations
+        """
+        self.api = api
+        self.rate = rate
+        self.ramp_up = ramp_up
+        self.duration = duration
+        self.ops, self.weights = zip(*mix.items())
+        self.workers = workers
+        self.random = random.Random(seed)
+
+        self.known_ids = []  # ids which exist on the server, used by get
+        self.own_ids = []  # ids created by this run, the only ones update and delete touch
+        self.ids_lock = threading.Lock()
+        self.phases = [PhaseStats('ramp-up'), PhaseStats('steady')]
+
+    def schedule(self):
+        """
+        Yield scheduled start of each request in seconds from the run start.
+        During ramp-up the rate grows linearly, so n requests are started by t = sqrt(2 * ramp_up * n / rate).
+        """
+        ramp_requests = int(self.rate * self.ramp_up / 2)
+        for n in range(ramp_requests):
+            yield math.sqrt(2 * self.ramp_up * n / self.rate)
+        for n in range(int(self.rate * self.duration)):
+            yield self.ramp_up + n / self.rate
+
+    def random_device(self) -> Device:
+        return Device(system_name=f'LOAD-{self.random.choice(device_props.first_names).upper()}-'
+                                  f'{self.random.randrange(10 ** 6)}',
+                      type=self.random.choice(device_props.device_types),
+                      hdd_capacity=str(2 ** self.random.randint(7, 12)))
+
+    def _pick(self, ids: list, pick: float, pop: bool = False):
+        """
+        :param ids:list known_ids or own_ids, changed by other workers, so it is checked and read under the lock
+        :param pick:float 0..1 drawn by the scheduler, the position of the id in ids
+        :param pop:bool remove the id from ids
+        :return: id, None if ids is empty
+        """
+        with self.ids_lock:
+            if not ids:
+                return None
+            index = int(pick * len(ids))
+            if pop:
+                ids[index], ids[-1] = ids[-1], ids[index]
+                return ids.pop()
+            return ids[index]
+
+    def _operation(self, op: str, device: Device, pick: float):
+        device_id = None
+        if op in ('get', 'update', 'delete'):
+            device_id = self._pick(self.known_ids if op == 'get' else self.own_ids, pick, pop=op == 'delete')
+            if device_id is None:
+                op = 'add'  # nothing to pick yet
+
+        if op == 'list':
+            self.api.get_devices()
+        elif op == 'get':
+            self.api.get_device_by_id(device_id)
+        elif op == 'add':
+            added = self.api.add_device(device)
+            with self.ids_lock:
+                self.own_ids.append(added['id'])
+                self.known_ids.append(added['id'])
+        elif op == 'update':
+            device.id = device_id
+            self.api.update_device(device)
+        elif op == 'delete':
+            with self.ids_lock:
+                if device_id in self.known_ids:
+                    self.known_ids.remove(device_id)
+            try:
+                self.api.delete_device(device_id)
+            except Exception:
+                with self.ids_lock:
+                    self.own_ids.append(device_id)  # still exists, deleted by cleanup
+                raise
+
+        return op
+
+    def _run_one(self, phase: PhaseStats, op: str, device: Device, pick: float, scheduled: float):
+        started = time.monotonic()
+        error = False
+        try:
+            with self.api.raising():
+                op = self._operation(op, device, pick)
+        except Exception as e:
+            log.debug('%s failed: %r', op, e)
+            error = True
+        finished = time.monotonic()
+        phase.record(op, finished - scheduled, finished - started, error)
+
+    def run(self) -> list:
+        """
+        Run ramp-up and steady phases.
+        :return: list of phase reports
+        """
+        self.known_ids = [d['id'] for d in self.api.get_devices()]
+        log.info('%s devices on the server, ramp-up %ss, steady %ss at %s rps',
+                 len(self.known_ids), self.ramp_up, self.duration, self.rate)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='load') as executor:
+            run_start = time.monotonic()
+            for phase in self.phases:
+                phase.started = run_start + (self.ramp_up if phase.name == 'steady' else 0)
+            for offset in self.schedule():
+                scheduled = run_start + offset
+                delay = scheduled - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                phase = self.phases[0] if offset < self.ramp_up else self.phases[1]
+                # every random draw happens here, worker threads would interleave them and break --seed
+                op = self.random.choices(self.ops, self.weights)[0]
+                executor.submit(self._run_one, phase, op, self.random_device(), self.random.random(), scheduled)
+            self.phases[0].finished = run_start + self.ramp_up
+        self.phases[1].finished = time.monotonic()
+
+        return [phase.to_dict() for phase in self.phases]
+
+    def cleanup(self):
+        """
+        Delete devices created by the run.
+        """
+        if self.own_ids:
+            log.info('Deleting %s devices created by the load run', len(self.own_ids))
+            result = self.api.delete_devices(self.own_ids)
+            if not result.ok:
+                log.error('%s devices were not deleted', len(result.errors))
+            self.own_ids = []
+
+
+def print_report(report: list):
+    for phase in report:
+        print(f"\n{phase['phase']}: {phase['requests']} requests in {phase['duration_s']:.1f}s, "
+              f"{phase['throughput_rps'] or 0:.1f} rps, error rate {(phase['error_rate'] or 0) * 100:.2f}%")
+        print(f"{'operation':<10}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for op, stats in phase['operations'].items():
+            latency = stats['latency']
+            print(f"{op:<10}{latency['count']:>8}{stats['errors']:>8}{latency['p50_ms']:>10.1f}"
+                  f"{latency['p95_ms']:>10.1f}{latency['p99_ms']:>10.1f}{latency['max_ms']:>10.1f}")
+
+
+if __name__ == '__main__':
+    import config
+
+    parser = config.parser
+    parser.add_argument('--api-url', help='URL to server app', env_var='API_URL')
+    parser.add_argument('--rate', type=float, default=20, help='steady requests per second. default: %(default)s')
+    parser.add_argument('--ramp-up', type=float, default=10, help='ramp-up seconds. default: %(default)s')
+    parser.add_argument('--duration', type=float, default=60, help='steady state seconds. default: %(default)s')
+    parser.add_argument('--mix', default='get=60,list=5,add=15,update=10,delete=10',
+                        help='operation weights. default: %(default)s')
+    parser.add_argument('--workers', type=int, default=100, help='max requests in flight. default: %(default)s')
+    parser.add_argument('--seed', type=int, help='random seed for a repeatable operation sequence')
+    parser.add_argument('--report', help='JSON report file. default: testresults/load-<timestamp>.json')
+    cfg, _ = parser.parse_known_args()
+    logger.configure(default_level=cfg.log_level, levels=cfg.log_levels, json_file=cfg.log_json_file)
+
+    with DevicesAPI(base_url=cfg.api_url,
+                    pool_connections=cfg.api_pool_connections,
+                    pool_maxsize=max(cfg.api_pool_maxsize, cfg.workers)) as devices_api:
+        generator = LoadGenerator(devices_api,
+                                  rate=cfg.rate,
+                                  ramp_up=cfg.ramp_up,
+                                  duration=cfg.duration,
+                                  mix=parse_mix(cfg.mix),
+                                  workers=cfg.workers,
+                                  seed=cfg.seed)
+        try:
+            load_report = generator.run()
+        finally:
+            generator.cleanup()
+
+    print_report(load_report)
+
+    report_path = cfg.report or os.path.join('testresults', f'load-{datetime.now().strftime("%Y%m%d-%H%M%S")}.json')
+    with open(report_path, 'w') as report_file:
+        json.dump({'config': {k: v for k, v in vars(cfg).items()}, 'phases': load_report}, report_file, indent=2)
+    log.info('Report saved to %s', report_path)
@@ -0,0 +1,39 @@
+import uuid
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Namespace:
+    """
+    Devices of one test run or pytest-xdist worker, told apart by the system name prefix,
+    so several suites can share one backend. The empty prefix is the whole backend.
+    """
+    prefix: str = ''
+
+    @classmethod
+    def create(cls, base: str = 'auto', worker: str = None) -> 'Namespace':
+        """
+        :param base:str common part of the prefix, auto generates a unique one
+        :param worker:str pytest-xdist worker id, every worker gets its own namespace
+        :return:
+        """
+        if base == 'auto':
+            base = 'NQ' + uuid.uuid4().hex[:6].upper()
+        return cls(f'{base}-{worker.upper()}-' if worker else f'{base}-')
+
+    def name(self, name: str) -> str:
+        """
+        System name within the namespace
+        """
+        return name if name.startswith(self.prefix) else self.prefix + name
+
+    def strip(self, name: str) -> str:
+        return name[len(self.prefix):] if name.startswith(self.prefix) else name
+
+    def owns(self, device: dict) -> bool:
+        return (device.get('system_name') or '').startswith(self.prefix)
+
+    def filter(self, devices: list) -> list:
+        if not self.prefix:
+            return devices
+        return [device for device in devices if self.owns(device)]
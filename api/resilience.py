@@ -0,0 +1,115 @@
+"""
+Building blocks of the RESTAPI tail-latency controls: jittered exponential backoff,
+rolling latency window for hedging deadlines and per-host circuit breaker.
+"""
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """
+    Raised instead of sending a request while the circuit of the host is open.
+    """
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    Full jitter exponential backoff: random delay between 0 and base * 2 ** attempt, at most cap.
+    :param attempt:int 0 for the first retry
+    :param base:float seconds
+    :param cap:float seconds
+    :return: seconds to sleep
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class LatencyWindow:
+    """
+    Latest latencies of every endpoint, used to tell a slow request from a normal one.
+    """
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        """
+        :param size:int latencies kept per endpoint
+        :param min_samples:int percentile is not known until there are this many samples
+        """
+        self.size = size
+        self.min_samples = min_samples
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def add(self, key: str, elapsed: float):
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.size)).append(elapsed)
+
+    def percentile(self, key: str, pct: float = 95) -> float:
+        """
+        :return: seconds, None if there are not enough samples
+        """
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+class CircuitBreaker:
+    """
+    closed: requests pass, consecutive failures are counted.
+    open: after failure_threshold consecutive failures requests fail fast for reset_timeout seconds.
+    half-open: then one trial request passes, its success closes the circuit, its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        return 'half-open' if time.monotonic() - self._opened_at >= self.reset_timeout else 'open'
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def release(self):
+        """
+        The request let through ended without a verdict on the host, e.g. an error of the client,
+        so the next request is the trial of a half-open circuit.
+        """
+        with self._lock:
+            self._trial = False
+
+    def failure(self) -> bool:
+        """
+        :return: True if the failure opened the circuit
+        """
+        with self._lock:
+            self.failures += 1
+            if self._trial or (self._opened_at is None and self.failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self._trial = False
+                return True
+            return False
@@ -0,0 +1,108 @@
+from collections import Counter
+from dataclasses import dataclass, field
+
+DEVICE_FIELDS = ('system_name', 'type', 'hdd_capacity')
+
+
+def normalise_device(device: dict, fields: tuple = DEVICE_FIELDS) -> dict:
+    """
+    Bring API and UI representations of a device to the same form:
+    UI shows capacity with ' GB' suffix, client app saves "WINDOWS WORKSTATION" with a space (see README Known Issues).
+    :param device:dict
+    :param fields:tuple fields to keep
+    :return: new dictionary with fields only
+    """
+    normalised = {}
+    for name in fields:
+        value = device.get(name)
+        if value is not None:
+            value = str(value).strip()
+            if name == 'hdd_capacity' and value.endswith(' GB'):
+                value = value[:-3]
+            elif name == 'type':
+                value = value.replace(' ', '_')
+        normalised[name] = value
+    return normalised
+
+
+@dataclass
+class FieldMismatch:
+    key: str
+    field: str
+    expected: object
+    actual: object
+
+
+@dataclass
+class DevicesDiff:
+    missing: list = field(default_factory=list)  # expected records not found in actual
+    extra: list = field(default_factory=list)  # actual records not found in expected
+    mismatches: list = field(default_factory=list)  # FieldMismatch of records found on both sides
+    duplicates: list = field(default_factory=list)  # keys found more than once on one side
+
+    @property
+    def ok(self) -> bool:
+        return not (self.missing or self.extra or self.mismatches or self.duplicates)
+
+    def __str__(self):
+        if self.ok:
+            return 'no difference'
+        lines = []
+        lines += [f'missing: {record}' for record in self.missing]
+        lines += [f'extra: {record}' for record in self.extra]
+        lines += [f'{m.key}.{m.field}: expected {m.expected!r}, actual {m.actual!r}' for m in self.mismatches]
+        lines += [f'duplicate key: {key}' for key in self.duplicates]
+        return '\n'.join(lines)
+
+
+def diff_devices(expected: list,
+                 actual: list,
+                 key: str = 'id',
+                 fields: tuple = DEVICE_FIELDS,
+                 normalise=normalise_device) -> DevicesDiff:
+    """
+    Compare two collections of devices keyed by key in O(n) time and memory.
+    Records without key are matched by the hash of all their fields.
+    :param expected:list of dictionaries, e.g. from API
+    :param actual:list of dictionaries, e.g. from UI; fields not in fields (edit, remove, displayed) are ignored
+    :param key:str field identifying a record
+    :param fields:tuple fields to compare
+    :param normalise:callable(record, fields) -> dict, None to compare values as is
+    :return: DevicesDiff
+    """
+    normalise = normalise or (lambda record, names: {name: record.get(name) for name in names})
+    result = DevicesDiff()
+
+    def index(records: list) -> tuple:
+        keyed, keyless = {}, Counter()
+        for record in records:
+            record_key = record.get(key)
+            values = normalise(record, fields)
+            if record_key is None:
+                keyless[tuple(values[name] for name in fields)] += 1
+            elif record_key in keyed:
+                result.duplicates.append(record_key)
+            else:
+                keyed[record_key] = values
+        return keyed, keyless
+
+    actual_keyed, actual_keyless = index(actual)
+    expected_keyed, expected_keyless = index(expected)
+
+    for record_key, expected_values in expected_keyed.items():
+        actual_values = actual_keyed.pop(record_key, None)
+        if actual_values is None:
+            result.missing.append({key: record_key, **expected_values})
+            continue
+        for name in fields:
+            if expected_values[name] != actual_values[name]:
+                result.mismatches.append(FieldMismatch(record_key, name, expected_values[name], actual_values[name]))
+
+    result.extra.extend({key: record_key, **values} for record_key, values in actual_keyed.items())
+
+    for values, count in (expected_keyless - actual_keyless).items():
+        result.missing.extend([dict(zip(fields, values))] * count)
+    for values, count in (actual_keyless - expected_keyless).items():
+        result.extra.extend([dict(zip(fields, values))] * count)
+
+    return result
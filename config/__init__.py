@@ -7,3 +7,39 @@ parser.add_argument('--default-config', is_config_file=True, default='config/def
 parser.add_argument('--env-config-file', required=False, is_config_file=True,
                     help='environment config file', env_var='ENV_CONFIG_FILE')
 parser.add_argument('-l', '--log-level', env_var='LOG_LEVEL', default='INFO', help='default: %(default)s')
+parser.add_argument('--log-levels', env_var='LOG_LEVELS', default='',
+                    help='per-module log levels, e.g. api=DEBUG,pom.navigator=WARNING')
+parser.add_argument('--log-json-file', env_var='LOG_JSON_FILE',
+                    help='also write log records as JSON lines to the file, e.g. testresults/log.jsonl')
+parser.add_argument('--api-pool-connections', type=int, default=10, env_var='API_POOL_CONNECTIONS',
+                    help='number of per-host connection pools kept by RESTAPI. default: %(default)s')
+parser.add_argument('--api-pool-maxsize', type=int, default=10, env_var='API_POOL_MAXSIZE',
+                    help='max number of keep-alive connections per host. default: %(default)s')
+parser.add_argument('--api-concurrency', type=int, default=10, env_var='API_CONCURRENCY',
+                    help='number of parallel requests made by bulk API calls, '
+                         'keep it not above api-pool-maxsize. default: %(default)s')
+parser.add_argument('--timings-db', env_var='TIMINGS_DB',
+                    help='SQLite file to save API request timings to, e.g. testresults/timings.sqlite. '
+                         'Timings are not saved if empty.')
+parser.add_argument('--run-id', env_var='RUN_ID',
+                    help='id of the run (build number, git sha) to group saved timings. default: current timestamp')
+parser.add_argument('--api-cache-ttl', type=float, default=0, env_var='API_CACHE_TTL',
+                    help='seconds to keep devices in the client-side index for lookups by id and name, '
+                         '0 disables the index. default: %(default)s')
+parser.add_argument('--api-retries', type=int, default=0, env_var='API_RETRIES',
+                    help='retries of idempotent API requests (GET, PUT, DELETE) with jittered exponential backoff. '
+                         'default: %(default)s')
+parser.add_argument('--api-backoff', type=float, default=0.1, env_var='API_BACKOFF',
+                    help='base backoff between retries in seconds, doubled by every retry. default: %(default)s')
+parser.add_argument('--api-hedge', action='store_true', env_var='API_HEDGE',
+                    help='send a duplicate of a GET which is slower than p95 of its endpoint')
+parser.add_argument('--api-breaker-threshold', type=int, default=0, env_var='API_BREAKER_THRESHOLD',
+                    help='consecutive failures which make API requests to the host fail fast, '
+                         '0 disables the circuit breaker. default: %(default)s')
+parser.add_argument('--api-breaker-reset', type=float, default=30, env_var='API_BREAKER_RESET',
+                    help='seconds before a request is let through an open circuit again. default: %(default)s')
+parser.add_argument('--api-http-cache', type=int, default=0, env_var='API_HTTP_CACHE',
+                    help='number of GET responses kept by the HTTP cache and revalidated with If-None-Match / '
+                         'If-Modified-Since, 0 disables the cache. default: %(default)s')
+parser.add_argument('--api-http-cache-file', env_var='API_HTTP_CACHE_FILE',
+                    help='SQLite file to keep the HTTP cache in across runs, e.g. testresults/http-cache.sqlite')
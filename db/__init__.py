@@ -0,0 +1,220 @@
+import atexit
+import math
+import os
+import pathlib
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import logger
+
+log = logger.get_logger(__name__, 'INFO')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    started REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS timings (
+    run_id TEXT NOT NULL,
+    started REAL NOT NULL,
+    method TEXT NOT NULL,
+    template TEXT NOT NULL,
+    url TEXT NOT NULL,
+    status INTEGER,
+    bytes INTEGER,
+    elapsed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS timings_run_endpoint ON timings (run_id, method, template);
+"""
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list.
+    :param sorted_values:list sorted ascending
+    :param pct:float 0..100
+    :return:
+    """
+    if not sorted_values:
+        return None
+    rank = min(max(1, math.ceil(pct * len(sorted_values) / 100)), len(sorted_values))
+    return sorted_values[rank - 1]
+
+
+class TimingRecorder:
+    """
+    Saves request timings to SQLite database.
+    record() only puts a sample to a queue, a background thread writes samples in batches,
+    so the request hot path never waits for disk.
+    """
+
+    def __init__(self,
+                 path: str = 'testresults/timings.sqlite',
+                 run_id: str = None,
+                 batch_size: int = 500,
+                 flush_interval: float = 1.0,
+                 read_only: bool = False):
+        """
+        :param path:str SQLite database file
+        :param run_id:str id of the run (build number, git sha), default is the current timestamp
+        :param batch_size:int max number of samples written in one transaction
+        :param flush_interval:float seconds to wait for more samples before writing a partial batch
+        :param read_only:bool only read reports of an existing database, nothing is created or recorded
+        :raise FileNotFoundError: if read_only and there is no database at path
+        """
+        self.path = path
+        self.run_id = run_id or datetime.now().strftime('%Y%m%d-%H%M%S')
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.read_only = read_only
+
+        if read_only:
+            if not os.path.isfile(path):
+                raise FileNotFoundError(f'No timings database {path}')
+            self._closed = True
+            return
+
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+
+        self._queue = queue.Queue()
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, name='timing-recorder', daemon=True)
+        self._writer.start()
+        atexit.register(self.close)  # write what is left in the queue when the run ends
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.read_only:
+            return sqlite3.connect(pathlib.Path(self.path).resolve().as_uri() + '?mode=ro', uri=True, timeout=30)
+        return sqlite3.connect(self.path, timeout=30)
+
+    def record(self, sample):
+        """
+        Queue a request timing to be saved.
+        :param sample:api.RequestTiming
+        :return:
+        """
+        if self._closed:
+            return
+        self._queue.put((self.run_id, sample.started, sample.method, sample.template, sample.url,
+                         sample.status, sample.nbytes, sample.elapsed))
+
+    def _write_loop(self):
+        connection = self._connect()
+        try:
+            while True:
+                row = self._queue.get()
+                if row is None:
+                    self._queue.task_done()
+                    break
+                batch = [row]
+                deadline = time.monotonic() + self.flush_interval
+                stop = False
+                while len(batch) < self.batch_size:
+                    try:
+                        row = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if row is None:
+                        stop = True
+                        break
+                    batch.append(row)
+                try:
+                    with connection:
+                        connection.execute('INSERT OR IGNORE INTO runs (run_id, started) VALUES (?, ?)',
+                                           (self.run_id, batch[0][1]))
+                        connection.executemany('INSERT INTO timings VALUES (?, ?, ?, ?, ?, ?, ?, ?)', batch)
+                except sqlite3.Error as e:
+                    log.error('Could not save %s timings to %s: %s', len(batch), self.path, e)
+                for _ in range(len(batch) + stop):
+                    self._queue.task_done()
+                if stop:
+                    break
+        finally:
+            connection.close()
+
+    def flush(self):
+        """
+        Block until all queued timings are written.
+        :return:
+        """
+        self._queue.join()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def runs(self) -> list:
+        """
+        Returns list of recorded runs, the latest first.
+        :return: list of dictionaries with run_id, started and count keys
+        """
+        with self._connect() as connection:
+            rows = connection.execute('SELECT r.run_id, r.started, COUNT(t.run_id) FROM runs r '
+                                      'LEFT JOIN timings t ON t.run_id = r.run_id '
+                                      'GROUP BY r.run_id ORDER BY r.started DESC').fetchall()
+        return [{'run_id': run_id, 'started': started, 'count': count} for run_id, started, count in rows]
+
+    def percentiles(self, run_id: str = None, pcts: tuple = (50, 95, 99)) -> list:
+        """
+        Per-endpoint latency percentiles of a run.
+        :param run_id:str default is the current run
+        :param pcts:tuple percentiles to calculate
+        :return: list of dictionaries with method, template, count, errors, and p<N> keys in seconds
+        """
+        run_id = run_id or self.run_id
+        with self._connect() as connection:
+            rows = connection.execute('SELECT method, template, status, elapsed FROM timings WHERE run_id = ? '
+                                      'ORDER BY method, template, elapsed', (run_id,)).fetchall()
+
+        endpoints = {}
+        for method, template, status, elapsed in rows:
+            endpoint = endpoints.setdefault((method, template), {'values': [], 'errors': 0})
+            endpoint['values'].append(elapsed)
+            if status is None or status >= 400:
+                endpoint['errors'] += 1
+
+        stats = []
+        for (method, template), endpoint in endpoints.items():
+            values = endpoint['values']
+            stat = {'method': method, 'template': template, 'count': len(values), 'errors': endpoint['errors']}
+            for pct in pcts:
+                stat[f'p{pct}'] = percentile(values, pct)
+            stats.append(stat)
+
+        return stats
+
+    def compare_runs(self, base_run_id: str, run_id: str = None, pct: int = 95) -> list:
+        """
+        Compare per-endpoint latency percentile of two runs.
+        :param base_run_id:str run to compare with, e.g. the previous build
+        :param run_id:str default is the current run
+        :param pct:int percentile to compare
+        :return: list of dictionaries with method, template, base, current, ratio keys, the worst regression first
+        """
+        key = f'p{pct}'
+        base = {(s['method'], s['template']): s[key] for s in self.percentiles(base_run_id, (pct,))}
+        current = {(s['method'], s['template']): s[key] for s in self.percentiles(run_id, (pct,))}
+
+        comparison = []
+        for endpoint in sorted(base.keys() | current.keys()):
+            before, after = base.get(endpoint), current.get(endpoint)
+            comparison.append({'method': endpoint[0],
+                               'template': endpoint[1],
+                               'base': before,
+                               'current': after,
+                               'ratio': after / before if before and after is not None else None})
+
+        return sorted(comparison, key=lambda c: c['ratio'] or 0, reverse=True)
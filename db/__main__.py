@@ -0,0 +1,45 @@
+"""
+Print request timing reports from the timings database.
+
+python -m db --timings-db testresults/timings.sqlite                  # percentiles of the latest run
+python -m db --timings-db testresults/timings.sqlite --compare BUILD1  # p95 of the latest run vs BUILD1
+"""
+import config
+import logger
+from db import TimingRecorder
+
+parser = config.parser
+parser.add_argument('--compare', help='run id to compare the run with')
+parser.add_argument('--runs', action='store_true', help='list recorded runs')
+
+cfg, _ = parser.parse_known_args()
+logger.configure(default_level=cfg.log_level, levels=cfg.log_levels, json_file=cfg.log_json_file)
+
+try:
+    recorder = TimingRecorder(path=cfg.timings_db or 'testresults/timings.sqlite', run_id=cfg.run_id or '-',
+                              read_only=True)
+except FileNotFoundError as e:
+    parser.exit(1, f'{e}\n')
+recorded_runs = [r for r in recorder.runs() if r['count']]
+
+if cfg.runs:
+    for run in recorded_runs:
+        print(f"{run['run_id']:<30} {run['count']:>8} requests")
+elif not recorded_runs and not cfg.run_id:
+    print('No timings recorded.')
+else:
+    run_id = cfg.run_id or recorded_runs[0]['run_id']
+    if cfg.compare:
+        print(f'p95 of {run_id} vs {cfg.compare}')
+        for c in recorder.compare_runs(cfg.compare, run_id):
+            base = f"{c['base'] * 1000:.1f}" if c['base'] is not None else '-'
+            current = f"{c['current'] * 1000:.1f}" if c['current'] is not None else '-'
+            ratio = f"{c['ratio']:.2f}x" if c['ratio'] is not None else ''
+            print(f"{c['method']:<7}{c['template']:<40}{base:>10} ms{current:>10} ms  {ratio}")
+    else:
+        print(f'Run {run_id}')
+        for s in recorder.percentiles(run_id):
+            print(f"{s['method']:<7}{s['template']:<40}{s['count']:>7} req {s['errors']:>5} err  "
+                  f"p50 {s['p50'] * 1000:.1f} ms  p95 {s['p95'] * 1000:.1f} ms  p99 {s['p99'] * 1000:.1f} ms")
+
+recorder.close()
@@ -1,17 +1,149 @@
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import threading
 
+FORMAT = '%(asctime)s - %(name)s - %(funcName)s - %(threadName)s - %(levelname)s - %(message)s'
+
+_queue = queue.SimpleQueue()
+_listener = None
+_lock = threading.RLock()
+_settings = {'default': 'INFO', 'levels': {}}  # default level and per-module levels from config
+_requested = {}  # logger name -> level passed to get_logger
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        """
+        Merge message and args in the calling thread (args may change later), everything else,
+        including exception formatting, is done by the listener thread.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line.
+    """
+
+    def format(self, record):
+        entry = {'time': self.formatTime(record),
+                 'ts': record.created,
+                 'level': record.levelname,
+                 'logger': record.name,
+                 'func': record.funcName,
+                 'thread': record.threadName,
+                 'message': record.getMessage()}
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+_handler = _QueueHandler(_queue)
+
+
+def parse_levels(levels: str) -> dict:
+    """
+    :param levels:str like 'api=DEBUG,pom.navigator=WARNING'
+    :return: dict logger name prefix -> level
+    """
+    parsed = {}
+    for item in (levels or '').split(','):
+        name, _, level = item.partition('=')
+        if name.strip() and level.strip():
+            parsed[name.strip()] = level.strip().upper()
+    return parsed
+
+
+def _effective_level(name: str) -> str:
+    """
+    Per-module level from config for the longest matching name prefix,
+    then the level requested in code, then the default level.
+    """
+    levels = _settings['levels']
+    parts = name.split('.')
+    for i in range(len(parts), 0, -1):
+        prefix = '.'.join(parts[:i])
+        if prefix in levels:
+            return levels[prefix]
+    return (_requested.get(name) or _settings['default']).upper()
 
-def get_logger(name, log_level="DEBUG"):
-    """Create logger on demand."""
 
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.getLevelName(log_level.upper()))
-    logging.getLogger("paramiko").setLevel(logging.WARNING)
+def configure(default_level: str = None, levels: str | dict = None, console: bool = True, json_file: str = None):
+    """
+    (Re)start the background listener which writes log records and apply levels to all loggers.
+    :param default_level:str level of loggers without a level in code or config
+    :param levels:str|dict per-module levels, e.g. 'api=DEBUG,pom=WARNING'
+    :param console:bool write to stderr. Switch it off under pytest live logging, which prints records itself.
+    :param json_file:str JSON lines file, e.g. testresults/log.jsonl
+    """
+    global _listener
+
+    with _lock:
+        if default_level:
+            _settings['default'] = default_level
+        if levels is not None:
+            _settings['levels'] = parse_levels(levels) if isinstance(levels, str) else dict(levels)
+
+        handlers = []
+        if console:
+            stream_handler = logging.StreamHandler()
+            stream_handler.setFormatter(logging.Formatter(FORMAT))
+            handlers.append(stream_handler)
+        if json_file:
+            os.makedirs(os.path.dirname(json_file) or '.', exist_ok=True)
+            file_handler = logging.FileHandler(json_file)
+            file_handler.setFormatter(JsonFormatter())
+            handlers.append(file_handler)
+
+        if _listener is not None:
+            _listener.stop()
+            for handler in _listener.handlers:
+                handler.close()
+        _listener = logging.handlers.QueueListener(_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+
+        root = logging.getLogger()
+        if _handler not in root.handlers:
+            root.addHandler(_handler)
+
+        for name in _requested:
+            logging.getLogger(name).setLevel(_effective_level(name))
+
+
+def shutdown():
+    """
+    Write queued records and stop the listener.
+    """
+    global _listener
+
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            for handler in _listener.handlers:
+                handler.close()
+            _listener = None
+
+
+atexit.register(shutdown)
+
+
+def get_logger(name, log_level=None):
+    """Create logger on demand."""
 
-    handler = logging.StreamHandler()
-    handler.setFormatter(
-        logging.Formatter('%(asctime)s - %(name)s - %(funcName)s - %(threadName)s - %(levelname)s - %(message)s')
-    )
-    logger.addHandler(handler)
+    with _lock:
+        if _listener is None:
+            configure()
+        _requested[name] = log_level
+        logger = logging.getLogger(name)
+        logger.setLevel(logging.getLevelName(_effective_level(name)))
+        logging.getLogger("paramiko").setLevel(logging.WARNING)
 
     return logger
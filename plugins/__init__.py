@@ -0,0 +1,3 @@
+"""
+pytest plugins of the framework. They are registered by tests/conftest.py.
+"""
@@ -0,0 +1,258 @@
+"""
+Latency budgets of API endpoints and UI actions.
+
+Budgets in config are checked against all samples of the session, an exceeded budget fails the run:
+    api-budgets=GET /devices=p95:500,GET /devices/{id}=p95:200
+    ui-budgets=open_ui=max:5000,add_device=p95:3000
+
+Budgets of a test are set with the marker and checked against samples taken while the test was running:
+    @pytest.mark.budget(p95_ms=200)                                   # every API request of the test
+    @pytest.mark.budget(p95_ms=200, endpoint='GET /devices/{id}')
+    @pytest.mark.budget(max_ms=3000, action='add_device')             # UI action
+"""
+import html
+import threading
+from dataclasses import dataclass
+from importlib.metadata import version
+
+import pytest
+
+from api import RESTAPI, RequestTiming
+from db import percentile
+from pom.navigator import DevicesUI
+import logger
+
+log = logger.get_logger(__name__)
+
+STATS = ('p50', 'p90', 'p95', 'p99', 'max')
+
+
+class LatencyBudgetWarning(pytest.PytestWarning):
+    pass
+
+
+def stat_value(values: list, stat: str) -> float:
+    """
+    :param values:list of seconds
+    :param stat:str one of STATS
+    :return: seconds
+    """
+    values = sorted(values)
+    if stat == 'max':
+        return values[-1] if values else None
+    return percentile(values, int(stat[1:]))
+
+
+@dataclass
+class Budget:
+    key: str  # api:<METHOD> <url template>, ui:<action>, or api:* for every request
+    stat: str  # one of STATS
+    limit_ms: float
+
+    def values(self, samples: dict) -> list:
+        if self.key == 'api:*':
+            return [v for key, values in samples.items() if key.startswith('api:') for v in values]
+        return samples.get(self.key, [])
+
+    def check(self, samples: dict) -> 'BudgetResult':
+        values = self.values(samples)
+        value = stat_value(values, self.stat)
+        return BudgetResult(self, len(values), value * 1000 if value is not None else None)
+
+    @classmethod
+    def from_marker(cls, marker) -> list:
+        """
+        Budgets of @pytest.mark.budget(p95_ms=200, endpoint='GET /devices/{id}')
+        """
+        kwargs = dict(marker.kwargs)
+        endpoint = kwargs.pop('endpoint', None)
+        action = kwargs.pop('action', None)
+        key = f'ui:{action}' if action else f"api:{endpoint or '*'}"
+
+        budgets = []
+        for name, limit in kwargs.items():
+            stat = name[:-3] if name.endswith('_ms') else name
+            if stat not in STATS:
+                raise ValueError(f"Unknown budget {name}, use one of: {', '.join(s + '_ms' for s in STATS)}")
+            budgets.append(cls(key, stat, float(limit)))
+        return budgets
+
+
+@dataclass
+class BudgetResult:
+    budget: Budget
+    count: int
+    value_ms: float  # None if there were no samples
+
+    @property
+    def exceeded(self) -> bool:
+        return self.value_ms is not None and self.value_ms > self.budget.limit_ms
+
+    def __str__(self):
+        b = self.budget
+        if self.value_ms is None:
+            return f'{b.key} {b.stat} <= {b.limit_ms:g} ms: no samples'
+        status = 'EXCEEDED' if self.exceeded else 'ok'
+        return f'{b.key} {b.stat} {self.value_ms:.1f} ms <= {b.limit_ms:g} ms of {self.count} samples: {status}'
+
+
+def parse_budgets(text: str, kind: str) -> list:
+    """
+    'GET /devices=p95:500,GET /devices/{id}=200' -> list of Budget, the statistic is p95 if omitted
+    :param text:str comma separated name=[stat:]milliseconds
+    :param kind:str api or ui
+    :return:
+    """
+    budgets = []
+    for item in filter(None, (i.strip() for i in (text or '').split(','))):
+        name, _, spec = item.rpartition('=')
+        stat, _, limit = spec.rpartition(':')
+        stat = stat.strip() or 'p95'
+        if not name.strip() or stat not in STATS:
+            raise ValueError(f'Invalid {kind} budget {item!r}, expected e.g. GET /devices=p95:500')
+        budgets.append(Budget(f'{kind}:{name.strip()}', stat, float(limit)))
+    return budgets
+
+
+class LatencyBudgets:
+    """
+    Collects RESTAPI request timings and DevicesUI action durations, checks them against the budgets
+    and adds a latency summary to the terminal and pytest-html reports.
+    Samples of pytest-xdist workers are sent to the controller, so session budgets are checked once for the whole run.
+    """
+
+    def __init__(self, config, budgets: list = (), mode: str = 'fail'):
+        """
+        :param config: pytest config
+        :param budgets:list of Budget checked against all samples of the session
+        :param mode:str fail or warn
+        """
+        self.config = config
+        self.budgets = list(budgets)
+        self.mode = mode
+        self.samples = {}  # key -> list of seconds of the whole session
+        self._test_samples = None  # samples of the running test
+        self._lock = threading.Lock()
+
+    def register(self):
+        RESTAPI.observers += (self.add_request,)
+        DevicesUI.observers += (self.add_action,)
+
+    def unregister(self):
+        RESTAPI.observers = tuple(o for o in RESTAPI.observers if o != self.add_request)
+        DevicesUI.observers = tuple(o for o in DevicesUI.observers if o != self.add_action)
+
+    def add_request(self, timing: RequestTiming):
+        self._add(f'api:{timing.method} {timing.template}', timing.elapsed)
+
+    def add_action(self, action: str, elapsed: float):
+        self._add(f'ui:{action}', elapsed)
+
+    def _add(self, key: str, elapsed: float):
+        # bulk calls report from their worker threads
+        with self._lock:
+            self.samples.setdefault(key, []).append(elapsed)
+            if self._test_samples is not None:
+                self._test_samples.setdefault(key, []).append(elapsed)
+
+    def check_session(self) -> list:
+        return [budget.check(self.samples) for budget in self.budgets]
+
+    def summary(self) -> list:
+        """
+        :return: rows of key, count, p50, p95, p99, max in ms and the budget check results of the key
+        """
+        budgets = {}
+        for result in self.check_session():
+            budgets.setdefault(result.budget.key, []).append(result)
+
+        rows = []
+        for key in sorted(self.samples):
+            values = self.samples[key]
+            rows.append([key, len(values)] +
+                        [stat_value(values, stat) * 1000 for stat in ('p50', 'p95', 'p99', 'max')] +
+                        [budgets.get(key, [])])
+        return rows
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_call(self, item):
+        with self._lock:
+            self._test_samples = {}
+        yield
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_makereport(self, item, call):
+        outcome = yield
+        if call.when != 'call':
+            return
+
+        with self._lock:
+            samples, self._test_samples = self._test_samples or {}, None
+        budgets = [budget for marker in item.iter_markers('budget') for budget in Budget.from_marker(marker)]
+        if not budgets:
+            return
+
+        results = [budget.check(samples) for budget in budgets]
+        report = outcome.get_result()
+        report.sections.append(('latency budget', '\n'.join(map(str, results))))
+
+        exceeded = [str(r) for r in results if r.exceeded]
+        if not exceeded or not report.passed:
+            return
+        if self.mode == 'fail':
+            report.outcome = 'failed'
+            report.longrepr = 'Latency budget exceeded:\n' + '\n'.join(exceeded)
+        else:
+            item.warn(LatencyBudgetWarning('Latency budget exceeded: ' + '; '.join(exceeded)))
+
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_testnodedown(self, node, error):
+        # pytest-xdist controller receives samples of a finished worker
+        for key, values in getattr(node, 'workeroutput', {}).get('latency_samples', {}).items():
+            self.samples.setdefault(key, []).extend(values)
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_sessionfinish(self, session):
+        if hasattr(self.config, 'workerinput'):
+            self.config.workeroutput['latency_samples'] = self.samples
+            return
+
+        exceeded = [str(r) for r in self.check_session() if r.exceeded]
+        for line in exceeded:
+            log.warning('Latency budget exceeded: %s', line)
+        if exceeded and self.mode == 'fail' and session.exitstatus == pytest.ExitCode.OK:
+            session.exitstatus = pytest.ExitCode.TESTS_FAILED
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if hasattr(self.config, 'workerinput') or not self.samples:
+            return
+        terminalreporter.write_sep('-', 'latency')
+        for key, count, p50, p95, p99, maximum, results in self.summary():
+            terminalreporter.write_line(f'{key:<40}{count:>7}  p50 {p50:8.1f} ms  p95 {p95:8.1f} ms  '
+                                        f'p99 {p99:8.1f} ms  max {maximum:8.1f} ms')
+            for result in results:
+                terminalreporter.write_line(f'    {result}', red=result.exceeded)
+        for result in self.check_session():
+            if result.budget.key not in self.samples:  # api:* or a budget without samples
+                terminalreporter.write_line(str(result), red=result.exceeded)
+
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_html_results_summary(self, prefix, summary, postfix):
+        if not self.samples:
+            return
+        header = ['', 'requests', 'p50 ms', 'p95 ms', 'p99 ms', 'max ms', 'budget']
+        rows = [[key, count, f'{p50:.1f}', f'{p95:.1f}', f'{p99:.1f}', f'{maximum:.1f}',
+                 '; '.join(str(r) for r in results)]
+                for key, count, p50, p95, p99, maximum, results in self.summary()]
+
+        if int(version('pytest-html').split('.')[0]) < 4:
+            # pytest-html 3 renders py.xml nodes
+            from py.xml import html as xml
+            prefix.extend([xml.h2('Latency'),
+                           xml.table(xml.tr([xml.th(h) for h in header]),
+                                     [xml.tr([xml.td(str(cell)) for cell in row]) for row in rows])])
+        else:
+            table = '<tr>' + ''.join(f'<th>{h}</th>' for h in header) + '</tr>'
+            for row in rows:
+                table += '<tr>' + ''.join(f'<td>{html.escape(str(cell))}</td>' for cell in row) + '</tr>'
+            prefix.extend(['<h2>Latency</h2>', f'<table>{table}</table>'])
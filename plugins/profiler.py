@@ -0,0 +1,242 @@
+"""
+Per-test time breakdown in Chrome Trace Event format, open the file in chrome://tracing or https://ui.perfetto.dev
+
+Every test is a span with setup, call and teardown phases inside. Phases contain spans of
+    api        RESTAPI requests
+    webdriver  WebDriver commands issued through the driver of WebDriverSetup
+    wait       element lookups which failed, i.e. an implicit or explicit wait ran out
+and the phase arguments sum up time of every category, the rest of the phase is local work.
+"""
+import json
+import os
+import threading
+import time
+
+import pytest
+from selenium.common.exceptions import NoSuchElementException
+from selenium.webdriver.support.abstract_event_listener import AbstractEventListener
+
+from api import RESTAPI, RequestTiming
+from pom import WebDriverSetup
+import logger
+
+log = logger.get_logger(__name__)
+
+CATEGORIES = ('api', 'webdriver', 'wait')
+
+
+def _busy(intervals: list) -> float:
+    """
+    Length of the union of (start, end) intervals, parallel requests of bulk calls are counted once.
+    """
+    total, current_start, current_end = 0, None, None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+
+class TraceListener(AbstractEventListener):
+    """
+    Turns WebDriver commands into profiler spans. A command span is open between before_* and after_*
+    or on_exception events of the same thread.
+    """
+
+    def __init__(self, profiler: 'TraceProfiler'):
+        self.profiler = profiler
+        self._local = threading.local()
+
+    def _begin(self, name: str, **args):
+        stack = self._local.__dict__.setdefault('stack', [])
+        stack.append((name, time.time(), args))
+
+    def _end(self, category: str = 'webdriver', **args):
+        stack = getattr(self._local, 'stack', None)
+        if not stack:
+            return
+        name, start, begin_args = stack.pop()
+        self.profiler.add_span(category, name, start, time.time() - start, {**begin_args, **args})
+
+    def before_navigate_to(self, url, driver):
+        self._begin('navigate_to', url=url)
+
+    def after_navigate_to(self, url, driver):
+        self._end()
+
+    def before_navigate_back(self, driver):
+        self._begin('navigate_back')
+
+    def after_navigate_back(self, driver):
+        self._end()
+
+    def before_navigate_forward(self, driver):
+        self._begin('navigate_forward')
+
+    def after_navigate_forward(self, driver):
+        self._end()
+
+    def before_find(self, by, value, driver):
+        self._begin('find', by=by, value=value)
+
+    def after_find(self, by, value, driver):
+        self._end()
+
+    def before_click(self, element, driver):
+        self._begin('click')
+
+    def after_click(self, element, driver):
+        self._end()
+
+    def before_change_value_of(self, element, driver):
+        self._begin('change_value_of')
+
+    def after_change_value_of(self, element, driver):
+        self._end()
+
+    def before_execute_script(self, script, driver):
+        self._begin('execute_script', script=script.strip()[:80])
+
+    def after_execute_script(self, script, driver):
+        self._end()
+
+    def before_close(self, driver):
+        self._begin('close')
+
+    def after_close(self, driver):
+        self._end()
+
+    def before_quit(self, driver):
+        self._begin('quit')
+
+    def after_quit(self, driver):
+        self._end()
+
+    def on_exception(self, exception, driver):
+        # a lookup of a missing element returns only when the wait is over
+        category = 'wait' if isinstance(exception, NoSuchElementException) else 'webdriver'
+        self._end(category, error=type(exception).__name__)
+
+
+class TraceProfiler:
+    """
+    Collects spans of tests, RESTAPI requests and WebDriver commands and saves them as Chrome Trace Event JSON.
+    """
+
+    def __init__(self, config, path: str):
+        """
+        :param config: pytest config
+        :param path:str trace file, e.g. testresults/trace.json
+        """
+        self.config = config
+        self.path = path
+        self.listener = TraceListener(self)
+        self.events = []
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self.saved_path = None
+
+    def register(self):
+        RESTAPI.observers += (self.add_request,)
+        WebDriverSetup.listener = self.listener
+
+    def unregister(self):
+        RESTAPI.observers = tuple(o for o in RESTAPI.observers if o != self.add_request)
+        if WebDriverSetup.listener is self.listener:
+            WebDriverSetup.listener = None
+
+    def add_span(self, category: str, name: str, start: float, duration: float, args: dict = None):
+        """
+        :param category:str
+        :param name:str
+        :param start:float unix time in seconds
+        :param duration:float seconds
+        :param args:dict shown in the trace viewer
+        """
+        thread = threading.current_thread()
+        with self._lock:
+            self._threads.setdefault(thread.ident, thread.name)
+            self.events.append({'name': name, 'cat': category, 'ph': 'X', 'pid': self._pid, 'tid': thread.ident,
+                                'ts': start * 1e6, 'dur': duration * 1e6, 'args': args or {}})
+
+    def add_request(self, timing: RequestTiming):
+        self.add_span('api', f'{timing.method} {timing.template}', timing.started, timing.elapsed,
+                      {'url': timing.url, 'status': timing.status, 'bytes': timing.nbytes})
+
+    def breakdown(self, first_event: int, start: float, end: float) -> dict:
+        """
+        Milliseconds of every category between start and end in events recorded since first_event.
+        :return: dictionary of <category>_ms and local_ms
+        """
+        with self._lock:
+            events = self.events[first_event:]
+        intervals = {category: [] for category in CATEGORIES}
+        for event in events:
+            if event['cat'] in intervals:
+                event_start = max(event['ts'] / 1e6, start)
+                event_end = min((event['ts'] + event['dur']) / 1e6, end)
+                if event_end > event_start:
+                    intervals[event['cat']].append((event_start, event_end))
+
+        result = {f'{category}_ms': _busy(intervals[category]) * 1000 for category in CATEGORIES}
+        result['local_ms'] = max(0.0, end - start - _busy([i for c in CATEGORIES for i in intervals[c]])) * 1000
+        return result
+
+    def _phase(self, item, phase: str):
+        first_event = len(self.events)
+        start = time.time()
+        yield
+        end = time.time()
+        self.add_span('pytest', phase, start, end - start,
+                      {'nodeid': item.nodeid, **self.breakdown(first_event, start, end)})
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_protocol(self, item, nextitem):
+        first_event = len(self.events)
+        start = time.time()
+        yield
+        end = time.time()
+        self.add_span('test', item.nodeid, start, end - start, self.breakdown(first_event, start, end))
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_setup(self, item):
+        yield from self._phase(item, 'setup')
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_call(self, item):
+        yield from self._phase(item, 'call')
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_teardown(self, item):
+        yield from self._phase(item, 'teardown')
+
+    def save(self):
+        worker = getattr(self.config, 'workerinput', {}).get('workerid')
+        path = self.path
+        if worker:
+            path = f'-{worker}'.join(os.path.splitext(path))  # one trace per pytest-xdist worker
+
+        with self._lock:
+            metadata = [{'name': 'process_name', 'ph': 'M', 'pid': self._pid, 'args': {'name': worker or 'pytest'}}]
+            metadata += [{'name': 'thread_name', 'ph': 'M', 'pid': self._pid, 'tid': tid, 'args': {'name': name}}
+                         for tid, name in self._threads.items()]
+            trace = {'traceEvents': metadata + self.events, 'displayTimeUnit': 'ms'}
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as trace_file:
+            json.dump(trace, trace_file)
+        log.info('Trace of %s events saved to %s', len(self.events), path)
+        return path
+
+    def pytest_sessionfinish(self, session):
+        self.saved_path = self.save()
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if self.saved_path:
+            terminalreporter.write_sep('-', f'trace saved to {self.saved_path}')
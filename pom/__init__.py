@@ -1,23 +1,133 @@
+import json
+import os
+import time
+
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.support.abstract_event_listener import AbstractEventListener
+from selenium.webdriver.support.event_firing_webdriver import EventFiringWebDriver
 from webdriver_manager.chrome import ChromeDriverManager
 
+from pom.waits import Waits
+import logger
+
+log = logger.get_logger(__name__, 'INFO')
+
+DRIVER_CACHE_FILE = os.path.join(os.path.expanduser('~'), '.wdm', 'noneqa-drivers.json')
+DRIVER_CACHE_TTL = 24 * 60 * 60  # seconds a resolved "latest" driver is used without asking the network again
+
+
+def resolve_chromedriver(version: str = None, path: str = None) -> str:
+    """
+    Returns chromedriver binary path.
+    ChromeDriverManager().install() checks the network for the latest driver on every call, so the resolved path is
+    cached in DRIVER_CACHE_FILE: a pinned version is resolved once and then works offline,
+    "latest" is resolved again after DRIVER_CACHE_TTL.
+    :param version:str chromedriver version to pin, e.g. 100.0.4896.60. None means latest.
+    :param path:str explicit chromedriver binary, nothing is resolved then
+    :return:
+    """
+    if path:
+        return path
+
+    key = version or 'latest'
+    try:
+        with open(DRIVER_CACHE_FILE) as cache_file:
+            cache = json.load(cache_file)
+    except (OSError, ValueError):
+        cache = {}
+
+    cached = cache.get(key)
+    if cached and os.path.isfile(cached['path']) and (version or time.time() - cached['resolved'] < DRIVER_CACHE_TTL):
+        return cached['path']
+
+    try:
+        manager = ChromeDriverManager(driver_version=version)  # webdriver-manager 4, None matches the installed Chrome
+    except TypeError:
+        manager = ChromeDriverManager(version=key)  # webdriver-manager 3
+    driver_path = manager.install()
+    log.info('Resolved chromedriver %s: %s', key, driver_path)
+    cache[key] = {'path': driver_path, 'resolved': time.time()}
+    try:
+        os.makedirs(os.path.dirname(DRIVER_CACHE_FILE), exist_ok=True)
+        with open(DRIVER_CACHE_FILE, 'w') as cache_file:
+            json.dump(cache, cache_file, indent=2)
+    except OSError as e:
+        log.warning('Could not cache chromedriver path: %s', e)
+
+    return driver_path
+
 
 class WebDriverSetup:
-    def __init__(self, browser: str = 'Chrome', implicit_wait: int = 10):
-        if browser.lower() == 'chrome':
+    driver_version: str = None  # optional chromedriver version pin
+    driver_path: str = None  # optional chromedriver binary, skips resolving
+    listener: AbstractEventListener = None  # optional listener of driver commands, e.g. the trace profiler plugin
+    service: 'BrowserService' = None  # optional pom.service.BrowserService, sessions are created there instead of launching
+
+    def __init__(self,
+                 browser: str = 'Chrome',
+                 implicit_wait: int = 10,
+                 headless: bool = False,
+                 setup: 'WebDriverSetup' = None):
+        """
+        :param browser:str only Chrome is implemented
+        :param implicit_wait:int seconds
+        :param headless:bool run browser without a window
+        :param setup:WebDriverSetup reuse the driver of another setup, e.g. checked out from DriverPool,
+                     instead of launching a browser. The driver is not closed by this object then.
+        """
+        self.driver = None
+        self._owns_driver = setup is None
+        if setup is not None:
+            self.driver = setup.driver
+            self.implicit_wait = setup.implicit_wait
+            self.waits = setup.waits
+        elif browser.lower() == 'chrome':
             options = Options()
-            options.add_argument('start-maximized')
-            # options.add_experimental_option('detach', True)
-            self.driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-            self.driver.implicitly_wait(implicit_wait)
+            if headless:
+                options.add_argument('--headless')
+                options.add_argument('--window-size=1920,1080')
+            else:
+                options.add_argument('start-maximized')
+            options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})  # DevTools events for NetworkCapture
+            if self.service is not None:
+                self.driver = self.service.session(options)
+            else:
+                service = Service(resolve_chromedriver(self.driver_version, self.driver_path))
+                self.driver = webdriver.Chrome(service=service, options=options)
+            if self.listener is not None:
+                self.driver = EventFiringWebDriver(self.driver, self.listener)
+            self.implicit_wait = float(implicit_wait)
+            self.driver.implicitly_wait(self.implicit_wait)
+            self.waits = Waits(self.driver, implicit_wait=self.implicit_wait, timeout=max(self.implicit_wait, 10))
         else:
             raise AttributeError(f'Browser {browser} not implemented.')
 
-    def __del__(self):
-        # pass
-        if self.driver:
-            self.driver.close()
-            # self.driver.quit()
+    def quit(self):
+        """
+        End the session and the chromedriver process launched for it. A session of the browser service ends,
+        the service and its attached Chrome keep running. A driver reused from another setup is not touched.
+        """
+        if self.driver is None or not self._owns_driver:
+            return
+        driver, self.driver = self.driver, None
+        session_id = driver.session_id
+        try:
+            driver.quit()
+        except Exception as e:
+            log.debug('Quit failed: %r', e)  # e.g. the browser has crashed
+        if self.service is not None:
+            self.service.release(session_id)
 
+    def __enter__(self) -> 'WebDriverSetup':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.quit()
+
+    def __del__(self):
+        try:
+            self.quit()
+        except Exception:
+            pass  # interpreter shutdown
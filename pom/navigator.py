@@ -1,22 +1,283 @@
-from selenium.common.exceptions import NoSuchElementException
+import json
+import time
+from contextlib import contextmanager, nullcontext
+
+from selenium.common.exceptions import NoSuchElementException, TimeoutException, WebDriverException
+from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import Select
 
+from api.namespace import Namespace
 import pom.locators as locators
 from pom import WebDriverSetup
+from pom.network import NetworkCapture
+from pom.perf import PerfRecorder
 import logger
 
 log = logger.get_logger(__name__, 'INFO')
 
+# details of a device row, the same as DevicesUI.get_device_details collects with WebDriver commands.
+# arguments: CSS selectors of the device row, name, type, capacity, edit and remove elements.
+ROW_DETAILS_JS = '''
+const [rowCss, nameCss, typeCss, capacityCss, editCss, removeCss] = arguments;
+const displayed = el => {
+    if (!el || !el.getClientRects().length) return false;
+    const style = window.getComputedStyle(el);
+    return style.visibility !== 'hidden' && style.display !== 'none' && style.opacity !== '0';
+};
+const text = el => el ? (displayed(el) ? el.innerText.trim() : '') : null;
+const rowDetails = row => {
+    const edit = row.querySelector(editCss);
+    const remove = row.querySelector(removeCss);
+    return {
+        system_name: text(row.querySelector(nameCss)),
+        type: text(row.querySelector(typeCss)),
+        hdd_capacity: text(row.querySelector(capacityCss)),
+        edit: edit ? displayed(edit) : null,
+        remove: remove ? displayed(remove) : null,
+        href: edit ? edit.href : null,
+        displayed: displayed(row)
+    };
+};
+'''
+
+# all devices in one WebDriver round trip
+DEVICES_DETAILS_JS = ROW_DETAILS_JS + '''
+return Array.from(document.querySelectorAll(rowCss), rowDetails);
+'''
+
+# installs a MutationObserver on the devices list (again, if the page was reloaded or the list replaced)
+# and returns only rows added, changed or removed since the previous call.
+# extra argument: CSS selector of the list element.
+DEVICES_SYNC_JS = ROW_DETAILS_JS + '''
+const listCss = arguments[6];
+const list = document.querySelector(listCss);
+let state = window.__noneqaDevices;
+let reset = false;
+if (!state || state.list !== list) {
+    if (state && state.observer) state.observer.disconnect();
+    state = window.__noneqaDevices = {list: list, keys: new Map(), dirty: new Set(), removed: [], next: 0};
+    reset = true;
+    if (list) {
+        list.querySelectorAll(rowCss).forEach(row => state.dirty.add(row));
+        const rowsOf = node => node.nodeType !== 1 ? [] :
+            (node.matches(rowCss) ? [node] : Array.from(node.querySelectorAll(rowCss)));
+        state.observer = new MutationObserver(records => {
+            for (const record of records) {
+                const target = record.target.nodeType === 1 ? record.target : record.target.parentElement;
+                const row = target && target.closest(rowCss);
+                if (row) state.dirty.add(row);
+                record.addedNodes.forEach(node => rowsOf(node).forEach(r => state.dirty.add(r)));
+                record.removedNodes.forEach(node => rowsOf(node).forEach(r => {
+                    state.dirty.delete(r);
+                    if (state.keys.has(r)) {
+                        state.removed.push(state.keys.get(r));
+                        state.keys.delete(r);
+                    }
+                }));
+            }
+        });
+        state.observer.observe(list, {childList: true, subtree: true, characterData: true, attributes: true});
+    }
+}
+const changed = [];
+state.dirty.forEach(row => {
+    if (!row.isConnected) return;
+    if (!state.keys.has(row)) state.keys.set(row, state.next++);
+    changed.push(Object.assign({key: state.keys.get(row)}, rowDetails(row)));
+});
+state.dirty.clear();
+const removed = state.removed;
+state.removed = [];
+return {reset: reset, changed: changed, removed: removed};
+'''
+
+# sets form fields the way the React app expects: through the native value setter of the element prototype
+# (React skips values assigned to the element property directly) followed by bubbling input and change events.
+# arguments: list of [CSS selector, value] pairs. Returns selectors of fields which were not found or not set.
+FORM_FILL_JS = '''
+const failed = [];
+for (const [css, value] of arguments[0]) {
+    const el = document.querySelector(css);
+    if (!el) { failed.push(css); continue; }
+    const proto = el instanceof HTMLSelectElement ? HTMLSelectElement.prototype
+        : el instanceof HTMLTextAreaElement ? HTMLTextAreaElement.prototype : HTMLInputElement.prototype;
+    Object.getOwnPropertyDescriptor(proto, 'value').set.call(el, String(value));
+    el.dispatchEvent(new Event('input', {bubbles: true}));
+    el.dispatchEvent(new Event('change', {bubbles: true}));
+    if (el.value !== String(value)) failed.push(css);
+}
+return failed;
+'''
+
+
+def _css(locator: dict) -> str:
+    if locator['by'] == By.ID:
+        return '#' + locator['value']
+    if locator['by'] == By.CSS_SELECTOR:
+        return locator['value']
+    raise ValueError(f'No CSS selector for {locator}')
+
+
+def _details_from_row(row: dict) -> dict:
+    """
+    Convert a row collected by ROW_DETAILS_JS to the get_device_details dictionary.
+    """
+    href = row['href']
+    return {
+        'system_name': row['system_name'],
+        'type': row['type'],
+        'hdd_capacity': row['hdd_capacity'].replace(' GB', '') if row['hdd_capacity'] is not None else None,
+        'edit': row['edit'],
+        'remove': row['remove'],
+        'id': href.split('/')[-1] if href is not None else None,
+        'displayed': row['displayed']
+    }
+
+
+def _row_selectors() -> tuple:
+    return (locators.MainPage.device['value'],
+            locators.MainPage.device_name['value'],
+            locators.MainPage.device_type['value'],
+            locators.MainPage.device_capacity['value'],
+            locators.MainPage.device_edit['value'],
+            locators.MainPage.device_remove['value'])
+
+
+class DevicesSnapshot:
+    """
+    Local copy of the devices list kept in sync with the page incrementally.
+    A MutationObserver installed in the page marks rows touched since the last sync(), so each sync
+    transfers only added, changed and removed rows, and lookups by name or id do not query the DOM.
+    After a page reload the observer is installed again and the whole list is pulled once.
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+        self._rows = {}  # key given by the page script -> details
+        self._by_id = {}  # device id -> key
+        self._by_name = {}  # system_name -> {key: None}
+
+    def _unlink(self, key: int):
+        details = self._rows.pop(key, None)
+        if details is None:
+            return
+        if self._by_id.get(details['id']) == key:
+            del self._by_id[details['id']]
+        keys = self._by_name.get(details['system_name'])
+        if keys is not None:
+            keys.pop(key, None)
+            if not keys:
+                del self._by_name[details['system_name']]
+
+    def sync(self) -> 'DevicesSnapshot':
+        """
+        Pull rows changed since the previous call.
+        :return: self, for snapshot.sync().find_by_name(name)
+        """
+        delta = self.driver.execute_script(DEVICES_SYNC_JS, *_row_selectors(), locators.MainPage.devices['value'])
+        if delta['reset']:
+            self._rows.clear()
+            self._by_id.clear()
+            self._by_name.clear()
+        for key in delta['removed']:
+            self._unlink(key)
+        for row in delta['changed']:
+            key = row.pop('key')
+            self._unlink(key)
+            details = _details_from_row(row)
+            self._rows[key] = details
+            if details['id'] is not None:
+                self._by_id[details['id']] = key
+            self._by_name.setdefault(details['system_name'], {})[key] = None
+
+        log.debug('Snapshot sync: reset %s, %s changed, %s removed, %s rows',
+                  delta['reset'], len(delta['changed']), len(delta['removed']), len(self._rows))
+
+        return self
+
+    def find_by_name(self, name: str) -> list:
+        """
+        :param name:str exact system_name
+        :return: list of device details, system_name is not unique
+        """
+        return [dict(self._rows[key]) for key in self._by_name.get(name, {})]
+
+    def find_by_id(self, device_id: str) -> dict:
+        """
+        :param device_id:str
+        :return: device details or None
+        """
+        key = self._by_id.get(device_id)
+        return dict(self._rows[key]) if key is not None else None
+
+    def devices(self) -> list:
+        return [dict(details) for details in self._rows.values()]
+
+    def __len__(self):
+        return len(self._rows)
+
+
+def _ids_by_name(exchanges: list, devices: list) -> list:
+    """
+    Ids assigned by the server to devices, matched by system_name of the POST body, so a blocked submit
+    or a missing response does not shift the ids of the following devices.
+    :param exchanges:list of pom.network.Exchange
+    :param devices:list of api.devices.Device or dictionaries with system_name
+    :return: list of ids in the order of devices, None for devices without a captured response
+    """
+    ids = {}
+    for exchange in exchanges:
+        try:
+            added = exchange.json() or {}
+            name = json.loads(exchange.request_body or '{}').get('system_name')
+        except (ValueError, AttributeError):
+            continue
+        if isinstance(added, dict) and name is not None:
+            ids.setdefault(name, added.get('id'))
+    return [ids.get((device if isinstance(device, dict) else vars(device))['system_name']) for device in devices]
+
 
 class DevicesUI(WebDriverSetup):
-    def __init__(self, browser: str, url: str, implicit_wait: int = 10):
-        super().__init__(browser, implicit_wait)
+    perf: PerfRecorder = None  # optional front-end metrics of open_ui, refresh and add_device
+    namespace: Namespace = Namespace()  # devices lists show only devices of the namespace, all by default
+    observers: tuple = ()  # callables taking action name and its duration in seconds, e.g. the latency budget plugin
+
+    def __init__(self, browser: str = 'Chrome', url: str = None, implicit_wait: int = 10, headless: bool = False,
+                 setup: WebDriverSetup = None):
+        super().__init__(browser, implicit_wait, headless, setup)
         # self.driver = driver
         self.url = url
+        self.snapshot = DevicesSnapshot(self.driver)
         self.open_ui()
 
+    @contextmanager
+    def _measure(self, action: str):
+        with self.perf.measure(self.driver, action) if self.perf is not None else nullcontext():
+            started = time.perf_counter()
+            yield
+            elapsed = time.perf_counter() - started
+        for observer in self.observers:
+            observer(action, elapsed)
+
     def open_ui(self):
-        self.driver.get(self.url)
+        with self._measure('open_ui'):
+            self.driver.get(self.url)
+            try:
+                self.waits.list_rerendered(None, locators.MainPage.devices, locators.MainPage.device)
+            except TimeoutException:
+                log.warning('Devices list is not rendered or is empty')
+
+    def refresh(self, expected: int = None):
+        """
+        Reload the page and wait for the devices list to be rendered again,
+        so following lookups can be done without waiting.
+        :param expected:int number of devices expected in the list if known
+        :return:
+        """
+        with self._measure('refresh'):
+            old_list = self.waits.find_optional(locators.MainPage.devices)
+            self.driver.refresh()
+            self.waits.list_rerendered(old_list, locators.MainPage.devices, locators.MainPage.device, expected)
 
     def close_ui(self):
         self.driver.close()
@@ -28,19 +289,15 @@ class DevicesUI(WebDriverSetup):
         """
         return self.driver.find_element(**locators.MainPage.devices)
 
-    @staticmethod
-    def get_device_details(device_element):
+    def get_device_details(self, device_element):
         def safe_find(by, value):
             """
-            Return None if NoSuchElementException occurs.
+            Return None if there is no such element, without waiting for it.
             :param by:By.ID
             :param value:str
             :return:
             """
-            try:
-                return device_element.find_element(by, value)
-            except NoSuchElementException:
-                return None
+            return self.waits.find_optional({'by': by, 'value': value}, parent=device_element)
 
         _system_name = safe_find(**locators.MainPage.device_name)
         _type = safe_find(**locators.MainPage.device_type)
@@ -57,21 +314,38 @@ class DevicesUI(WebDriverSetup):
             'displayed': device_element.is_displayed()
         }
 
-        log.debug(f'Details: {details}')
+        log.debug('Details: %s', details)
 
         return details
 
-    def get_devices_list(self) -> list:
+    def get_devices_list(self, bulk: bool = True) -> list:
         """
-        Returns list of device dictionaries
+        Returns list of device dictionaries of the namespace
+        :param bulk:bool collect all devices with one script call instead of several WebDriver commands per device
         :return: python list of dictionaries with each device details resolved from UI
         """
+        if bulk:
+            return self.namespace.filter(self.get_devices_list_bulk())
+
         device_elements = self.driver.find_elements(**locators.MainPage.device)  # find all tags with device
         devices = list()
         for device_elements in device_elements:
             device = self.get_device_details(device_elements)  # convert element to dictionary
             devices.append(device)
 
+        return self.namespace.filter(devices)
+
+    def get_devices_list_bulk(self) -> list:
+        """
+        Returns list of device dictionaries of the same shape as get_device_details,
+        collected by a single execute_script call.
+        :return:
+        """
+        rows = self.driver.execute_script(DEVICES_DETAILS_JS, *_row_selectors())
+        devices = [_details_from_row(row) for row in rows]
+
+        log.debug('%s devices collected by script', len(devices))
+
         return devices
 
     def get_device_by_name(self, name: str):
@@ -91,19 +365,110 @@ class DevicesUI(WebDriverSetup):
         """
         return self.driver.find_element(**locators.MainPage.find_device_by_id(device_id))
 
-    def add_device(self, system_name: str, device_type: str, hdd_capacity: str | int):
+    def add_device(self, system_name: str, device_type: str, hdd_capacity: str | int, capture_id: bool = True,
+                   keystrokes: bool = False):
+        """
+        Add a device with the form of the client app.
+        :param system_name:str
+        :param device_type:str
+        :param hdd_capacity:str|int
+        :param capture_id:bool record the POST request made by the app and return the id assigned by the server
+        :param keystrokes:bool click and type into every field like a user, instead of setting the values by script
+        :return: id of the created device or None if it was not captured
+        """
+        with self._measure('add_device'):
+            device_id = self._add_device(system_name, device_type, hdd_capacity, capture_id, keystrokes)
+            try:
+                self.waits.list_rerendered(None, locators.MainPage.devices, locators.MainPage.device)
+            except TimeoutException:
+                log.warning('Devices list is not rendered after adding a device')
+
+        return device_id
+
+    def add_devices(self, devices: list, capture_ids: bool = True, keystrokes: bool = False) -> list:
+        """
+        Add devices one after another with the form of the client app. Only the form is awaited between devices,
+        the devices list is awaited once at the end.
+        :param devices:list of api.devices.Device or dictionaries with system_name, type or device_type, hdd_capacity
+        :param capture_ids:bool record the POST requests made by the app and return the ids assigned by the server
+        :param keystrokes:bool click and type into every field like a user, instead of setting the values by script
+        :return: list of ids in the order of devices, None for ids which were not captured
+        """
+        capture = None
+        if capture_ids:
+            try:
+                capture = NetworkCapture(self.driver).start()
+            except WebDriverException as e:
+                log.warning('Network capture is not available, device ids will not be known: %r', e)
+
+        with self._measure('add_devices'):
+            for device in devices:
+                fields = device if isinstance(device, dict) else vars(device)
+                self._fill_device_form(fields['system_name'], fields.get('device_type', fields.get('type')),
+                                       fields['hdd_capacity'], keystrokes)
+                if not self.waits.absent(locators.DevicePage.system_name):
+                    log.warning('Device form is still open after submitting %s', fields['system_name'])
+                if capture is not None:
+                    capture.collect()  # take response bodies before the page drops them
+
+            try:
+                self.waits.rows_settled(locators.MainPage.device)
+            except TimeoutException:
+                log.warning('Devices list is not rendered after adding %s devices', len(devices))
+
+        if capture is None:
+            return [None] * len(devices)
+        try:
+            exchanges = capture.wait_for_all('POST', 'devices', count=len(devices))
+        except TimeoutError as e:
+            log.warning('Could not capture all added devices: %r', e)
+            exchanges = capture.find('POST', 'devices')
+
+        return _ids_by_name(exchanges, devices)
+
+    def _add_device(self, system_name: str, device_type: str, hdd_capacity: str | int, capture_id: bool,
+                    keystrokes: bool):
+        if not capture_id:
+            return self._fill_device_form(system_name, device_type, hdd_capacity, keystrokes)
+
+        try:
+            capture = NetworkCapture(self.driver).start()
+        except WebDriverException as e:
+            log.warning('Network capture is not available, device id will not be known: %r', e)
+            return self._fill_device_form(system_name, device_type, hdd_capacity, keystrokes)
+
+        self._fill_device_form(system_name, device_type, hdd_capacity, keystrokes)
+        try:
+            added = capture.wait_for('POST', 'devices').json()
+        except (TimeoutError, ValueError) as e:
+            log.warning('Could not capture the added device: %r', e)
+            return None
+
+        log.debug('Device added with id %s: %s', added.get('id'), added)
+
+        return added.get('id')
+
+    def _fill_device_form(self, system_name: str, device_type: str, hdd_capacity: str | int, keystrokes: bool = False):
 
         self.driver.find_element(**locators.MainPage.add_device_btn).click()
 
-        system_name_input = self.driver.find_element(**locators.DevicePage.system_name)
-        system_name_input.click()
-        system_name_input.send_keys(system_name)
+        if keystrokes:
+            system_name_input = self.driver.find_element(**locators.DevicePage.system_name)
+            system_name_input.click()
+            system_name_input.send_keys(system_name)
 
-        device_type_ddl = Select(self.driver.find_element(**locators.DevicePage.type))
-        device_type_ddl.select_by_value(device_type)
+            device_type_ddl = Select(self.driver.find_element(**locators.DevicePage.type))
+            device_type_ddl.select_by_value(device_type)
 
-        hdd_capacity_input = self.driver.find_element(**locators.DevicePage.hdd_capacity)
-        hdd_capacity_input.click()
-        hdd_capacity_input.send_keys(hdd_capacity)
+            hdd_capacity_input = self.driver.find_element(**locators.DevicePage.hdd_capacity)
+            hdd_capacity_input.click()
+            hdd_capacity_input.send_keys(hdd_capacity)
+        else:
+            self.waits.present(locators.DevicePage.hdd_capacity)  # the form is rendered
+            failed = self.driver.execute_script(FORM_FILL_JS, [[_css(locators.DevicePage.system_name), system_name],
+                                                               [_css(locators.DevicePage.type), device_type],
+                                                               [_css(locators.DevicePage.hdd_capacity), hdd_capacity]])
+            if failed:
+                raise NoSuchElementException(f'Could not set form fields: {failed}')
 
         self.driver.find_element(**locators.DevicePage.submit_btn).click()
@@ -0,0 +1,165 @@
+import json
+import time
+from dataclasses import dataclass
+
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.remote.command import Command
+
+import logger
+
+log = logger.get_logger(__name__, 'INFO')
+
+CAPTURED_TYPES = ('XHR', 'Fetch')
+
+
+def execute_cdp(driver, cmd: str, params: dict = None) -> dict:
+    """
+    driver.execute_cdp_cmd for any driver.
+    :raise WebDriverException: also if the driver has no DevTools support at all
+    """
+    try:
+        execute = driver.execute_cdp_cmd
+    except AttributeError as e:
+        raise WebDriverException(f'DevTools are not supported by {type(driver).__name__}') from e
+    return execute(cmd, params or {})
+
+
+@dataclass
+class Exchange:
+    request_id: str
+    method: str
+    url: str
+    request_body: str = None
+    resource_type: str = None
+    status: int = None
+    response_body: str = None
+    finished: bool = False
+    failed: bool = False
+
+    def json(self):
+        return json.loads(self.response_body) if self.response_body else None
+
+
+class NetworkCapture:
+    """
+    Records XHR/fetch requests and responses made by the page while a UI action runs, using Chrome DevTools
+    Network domain events from the performance log. The driver must be created with
+    goog:loggingPrefs {'performance': 'ALL'}, WebDriverSetup does it for Chrome.
+
+    with NetworkCapture(driver) as capture:
+        ui_action()
+        exchange = capture.wait_for('POST', '/devices')
+    """
+
+    def __init__(self, driver, types: tuple = CAPTURED_TYPES):
+        """
+        :param driver:Chrome WebDriver
+        :param types:tuple CDP resource types to record
+        """
+        self.driver = driver
+        self.types = types
+        self.exchanges = {}  # request id -> Exchange, in order of requests
+
+    def start(self) -> 'NetworkCapture':
+        """
+        :raise WebDriverException: if the driver does not support DevTools or performance log
+        """
+        execute_cdp(self.driver, 'Network.enable')
+        self._log()  # drop events which happened before the capture
+        return self
+
+    def _log(self) -> list:
+        # webdriver.Remote, e.g. a session of pom.service, has no get_log, the command itself works for Chrome
+        return self.driver.execute(Command.GET_LOG, {'type': 'performance'})['value']
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            self.collect()
+        except WebDriverException as e:
+            log.debug('Could not collect network events: %r', e)
+
+    def collect(self) -> list:
+        """
+        Read new DevTools events and update exchanges. Response bodies are taken as soon as loading finishes,
+        before the page navigates away and the browser drops them.
+        :return: list of all exchanges recorded so far
+        """
+        for entry in self._log():
+            message = json.loads(entry['message'])['message']
+            method, params = message.get('method'), message.get('params', {})
+            request_id = params.get('requestId')
+
+            if method == 'Network.requestWillBeSent':
+                if params.get('type') not in self.types:
+                    continue
+                request = params['request']
+                self.exchanges[request_id] = Exchange(request_id=request_id,
+                                                      method=request['method'],
+                                                      url=request['url'],
+                                                      request_body=request.get('postData'),
+                                                      resource_type=params.get('type'))
+            elif request_id not in self.exchanges:
+                continue
+            elif method == 'Network.responseReceived':
+                self.exchanges[request_id].status = params['response']['status']
+            elif method == 'Network.loadingFinished':
+                exchange = self.exchanges[request_id]
+                try:
+                    exchange.response_body = execute_cdp(self.driver, 'Network.getResponseBody',
+                                                         {'requestId': request_id})['body']
+                except WebDriverException as e:
+                    log.debug('No body for %s %s: %r', exchange.method, exchange.url, e)
+                exchange.finished = True
+            elif method == 'Network.loadingFailed':
+                self.exchanges[request_id].finished = True
+                self.exchanges[request_id].failed = True
+
+        return list(self.exchanges.values())
+
+    def find(self, method: str = None, url_contains: str = None, finished: bool = True) -> list:
+        """
+        :param method:str HTTP method
+        :param url_contains:str part of URL
+        :param finished:bool only exchanges with the response received
+        :return: list of matching Exchange
+        """
+        return [e for e in self.collect()
+                if (method is None or e.method == method)
+                and (url_contains is None or url_contains in e.url)
+                and (e.finished or not finished)]
+
+    def wait_for(self, method: str = None, url_contains: str = None, timeout: float = 10,
+                 poll: float = 0.1) -> Exchange:
+        """
+        Wait for a matching exchange to finish.
+        :return: the first matching Exchange
+        :raise TimeoutError:
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            found = self.find(method, url_contains)
+            if found:
+                return found[0]
+            if time.monotonic() > deadline:
+                raise TimeoutError(f'No {method or ""} {url_contains or ""} response in {timeout}s')
+            time.sleep(poll)
+
+    def wait_for_all(self, method: str = None, url_contains: str = None, count: int = 1, timeout: float = 10,
+                     poll: float = 0.1) -> list:
+        """
+        Wait for count matching exchanges to finish.
+        :return: matching exchanges in order of requests
+        :raise TimeoutError:
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            found = self.find(method, url_contains)
+            if len(found) >= count:
+                return found
+            if time.monotonic() > deadline:
+                raise TimeoutError(f'{len(found)} of {count} {method or ""} {url_contains or ""} responses '
+                                   f'in {timeout}s')
+            time.sleep(poll)
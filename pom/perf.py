@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+from selenium.common.exceptions import WebDriverException
+
+import pom.locators as locators
+from pom.network import execute_cdp
+import logger
+
+log = logger.get_logger(__name__, 'INFO')
+
+# installed into every new document before the app scripts run: records long tasks and every change of the number of
+# device rows (counted once per animation frame), so render time can be read after the action is over.
+PERF_INIT_JS = '''
+(() => {
+    if (window.__noneqaPerf) return;
+    const perf = window.__noneqaPerf = {longTasks: [], rows: [], start: 0};
+    try { performance.setResourceTimingBufferSize(10000); } catch (e) {}
+    try {
+        new PerformanceObserver(list => list.getEntries().forEach(e => perf.longTasks.push([e.startTime, e.duration])))
+            .observe({type: 'longtask', buffered: true});
+    } catch (e) {}
+    let last = -1, scheduled = false;
+    const count = () => {
+        scheduled = false;
+        const n = document.querySelectorAll(%(row_css)s).length;
+        if (n !== last) { last = n; perf.rows.push([performance.now(), n]); }
+    };
+    const observe = () => new MutationObserver(() => {
+        if (!scheduled) { scheduled = true; requestAnimationFrame(count); }
+    }).observe(document.documentElement, {childList: true, subtree: true});
+    if (document.documentElement) observe(); else document.addEventListener('readystatechange', observe, {once: true});
+})();
+'''
+
+PERF_START_JS = '''
+const perf = window.__noneqaPerf;
+window.__noneqaPerfToken = arguments[0];
+if (perf) perf.start = performance.now();
+'''
+
+PERF_COLLECT_JS = '''
+const perf = window.__noneqaPerf || {longTasks: [], rows: [], start: 0};
+const navigated = window.__noneqaPerfToken !== arguments[0];
+const start = navigated ? 0 : perf.start;
+const navigation = performance.getEntriesByType('navigation')[0];
+const memory = performance.memory;
+return {
+    navigated: navigated,
+    start: start,
+    now: performance.now(),
+    navigation: navigated && navigation ? navigation.toJSON() : null,
+    resources: performance.getEntriesByType('resource').filter(e => e.startTime >= start).map(e => ({
+        name: e.name, initiator: e.initiatorType, start: e.startTime, duration: e.duration,
+        transfer_size: e.transferSize, body_size: e.decodedBodySize
+    })),
+    long_tasks: perf.longTasks.filter(t => t[0] >= start),
+    rows: perf.rows.filter(r => r[0] >= start),
+    rows_now: document.querySelectorAll(arguments[1]).length,
+    heap: memory ? {used: memory.usedJSHeapSize, total: memory.totalJSHeapSize, limit: memory.jsHeapSizeLimit} : null
+};
+'''
+
+
+class PerfRecorder:
+    """
+    Front-end metrics of UI actions: Navigation and Resource Timing, long tasks, time until the devices list
+    has rendered its rows, and JS heap size. Every measured action is appended as one JSON line to path.
+    """
+
+    def __init__(self, path: str = None, run_id: str = None):
+        """
+        :param path:str JSON lines file, default is testresults/perf-<run_id>.jsonl
+        :param run_id:str default is the current timestamp
+        """
+        self.run_id = run_id or datetime.now().strftime('%Y%m%d-%H%M%S')
+        self.path = path or os.path.join('testresults', f'perf-{self.run_id}.jsonl')
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def install(driver):
+        """
+        Make the browser run the metrics script in every new document. Done once per driver.
+        """
+        if getattr(driver, '_noneqa_perf_installed', False):
+            return
+        source = PERF_INIT_JS % {'row_css': json.dumps(locators.MainPage.device['value'])}
+        try:
+            execute_cdp(driver, 'Page.addScriptToEvaluateOnNewDocument', {'source': source})
+        except WebDriverException as e:
+            log.debug('DevTools is not available, metrics start from the current page only: %r', e)
+        driver.execute_script(source)  # the current document
+        driver._noneqa_perf_installed = True
+
+    @contextmanager
+    def measure(self, driver, action: str, **details):
+        """
+        with recorder.measure(driver, 'add_device'):
+            ...
+        :param driver:WebDriver
+        :param action:str name of the action
+        :param details: extra fields saved with the record
+        """
+        token = uuid.uuid4().hex
+        try:
+            self.install(driver)
+            driver.execute_script(PERF_START_JS, token)
+        except WebDriverException as e:
+            log.debug('Could not start measuring %s: %r', action, e)
+        started = time.monotonic()
+
+        yield
+
+        wall = time.monotonic() - started
+        try:
+            metrics = driver.execute_script(PERF_COLLECT_JS, token, locators.MainPage.device['value'])
+        except WebDriverException as e:
+            log.warning('Could not collect metrics of %s: %r', action, e)
+            return
+        self.save(self.record(action, wall, metrics, details))
+
+    def record(self, action: str, wall: float, metrics: dict, details: dict) -> dict:
+        start = metrics['start']
+        rows = metrics['rows']
+        long_tasks = metrics['long_tasks']
+        return {
+            'run_id': self.run_id,
+            'action': action,
+            'ts': time.time(),
+            'wall_ms': wall * 1000,
+            'navigated': metrics['navigated'],
+            'rows': metrics['rows_now'],
+            # time from the action start (or navigation start) to the last change of the number of rows
+            'rows_rendered_ms': rows[-1][0] - start if rows else None,
+            'navigation': metrics['navigation'],
+            'resources': metrics['resources'],
+            'long_tasks': {'count': len(long_tasks),
+                           'total_ms': sum(t[1] for t in long_tasks),
+                           'max_ms': max((t[1] for t in long_tasks), default=0)},
+            'heap': metrics['heap'],
+            **details
+        }
+
+    def save(self, record: dict):
+        log.debug('%s: %s rows rendered in %s ms', record['action'], record['rows'], record['rows_rendered_ms'])
+        line = json.dumps(record)
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'a') as perf_file:
+                perf_file.write(line + '\n')
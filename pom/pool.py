@@ -0,0 +1,129 @@
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+from pom import WebDriverSetup
+import logger
+
+log = logger.get_logger(__name__, 'INFO')
+
+
+class DriverPool:
+    """
+    Pool of browsers reused between tests.
+    Browsers are launched lazily up to size and reset on check in (cookies, storage, extra windows, navigation),
+    which is much cheaper than launching a new one.
+    With pytest-xdist every worker is a separate process and gets its own pool, see DriverPool.shared().
+    """
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, size: int = 1, browser: str = 'Chrome', implicit_wait: int = 10, headless: bool = False):
+        """
+        :param size:int max number of browsers
+        :param browser:str
+        :param implicit_wait:int seconds
+        :param headless:bool
+        """
+        self.size = max(1, int(size))
+        self.browser = browser
+        self.implicit_wait = implicit_wait
+        self.headless = headless
+
+        self._idle = queue.LifoQueue()  # the most recently used browser is the warmest one
+        self._all = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, **kwargs) -> 'DriverPool':
+        """
+        Pool shared by the whole process (one pytest or pytest-xdist worker process).
+        kwargs are used only when the pool is created.
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(**kwargs)
+                log.info('Driver pool of %s for worker %s',
+                         cls._shared.size, os.environ.get('PYTEST_XDIST_WORKER', 'main'))
+            return cls._shared
+
+    def checkout(self, timeout: float = None) -> WebDriverSetup:
+        """
+        Take an idle browser, launch a new one if the pool is not full, or wait for one to be checked in.
+        :param timeout:float seconds to wait, None waits forever
+        :return:
+        :raise queue.Empty: on timeout
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            launch = len(self._all) < self.size
+            if launch:
+                self._all.append(None)  # reserve the slot while the browser is starting
+
+        if launch:
+            try:
+                setup = WebDriverSetup(self.browser, self.implicit_wait, headless=self.headless)
+            except Exception:
+                with self._lock:
+                    self._all.remove(None)
+                raise
+            with self._lock:
+                self._all[self._all.index(None)] = setup
+            return setup
+
+        return self._idle.get(timeout=timeout)
+
+    def checkin(self, setup: WebDriverSetup):
+        """
+        Reset the browser and return it to the pool. A browser which cannot be reset is quit and replaced later.
+        """
+        try:
+            self.reset(setup)
+        except Exception as e:
+            log.warning('Could not reset browser, discarding it: %r', e)
+            self.discard(setup)
+            return
+        self._idle.put(setup)
+
+    def discard(self, setup: WebDriverSetup):
+        with self._lock:
+            if setup in self._all:
+                self._all.remove(setup)
+        setup.quit()
+
+    @staticmethod
+    def reset(setup: WebDriverSetup):
+        driver = setup.driver
+        handles = driver.window_handles
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(handles[0])
+        driver.delete_all_cookies()
+        driver.execute_script('try { window.localStorage.clear(); window.sessionStorage.clear(); } catch (e) {}')
+        driver.get('about:blank')
+        driver.implicitly_wait(setup.implicit_wait)
+
+    @contextmanager
+    def driver(self, timeout: float = None) -> WebDriverSetup:
+        """
+        with pool.driver() as setup:
+            DevicesUI(url=url, setup=setup)
+        """
+        setup = self.checkout(timeout)
+        try:
+            yield setup
+        finally:
+            self.checkin(setup)
+
+    def close(self):
+        with self._lock:
+            setups, self._all = [s for s in self._all if s is not None], []
+        for setup in setups:
+            setup.quit()
+        self._idle = queue.LifoQueue()
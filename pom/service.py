@@ -0,0 +1,316 @@
+"""
+Long-lived local chromedriver and Chrome shared by test runs, so a run does not wait for the browser to start.
+
+python -m pom.service start --headless --idle-timeout 1800   # supervisor, runs until stopped or idle
+python -m pom.service status
+python -m pom.service stop
+
+python -m pytest --browser-service auto   # use the service, it is started in background if it is not running
+
+Sessions are created with webdriver.Remote through the service chromedriver. One session at a time attaches to
+the running Chrome over its remote debugging port; concurrent sessions (pool size above 1, pytest-xdist) get
+their own Chrome launched by the service chromedriver.
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+
+import logger
+
+log = logger.get_logger(__name__, 'INFO')
+
+SERVICE_DIR = os.path.join(os.path.expanduser('~'), '.wdm')
+STATE_FILE = os.path.join(SERVICE_DIR, 'noneqa-browser-service.json')
+CHROME_CANDIDATES = ('google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser', 'chrome',
+                     r'C:\Program Files\Google\Chrome\Application\chrome.exe',
+                     r'C:\Program Files (x86)\Google\Chrome\Application\chrome.exe',
+                     '/Applications/Google Chrome.app/Contents/MacOS/Google Chrome')
+HEALTH_INTERVAL = 5  # seconds between health checks of the supervisor
+
+
+def find_chrome() -> str:
+    for candidate in CHROME_CANDIDATES:
+        path = shutil.which(candidate) or (candidate if os.path.isfile(candidate) else None)
+        if path:
+            return path
+    raise FileNotFoundError('Chrome is not found, pass --chrome-binary')
+
+
+class BrowserService:
+    """
+    Client of the service: health checks and sessions. The supervisor side is serve().
+    Clients touch the state file on every session, the supervisor shuts down after idle_timeout
+    without new or running sessions.
+    """
+
+    def __init__(self, port: int = 9515, debug_port: int = 9222, attach: bool = True,
+                 state_file: str = STATE_FILE):
+        """
+        :param port:int chromedriver port
+        :param debug_port:int Chrome remote debugging port
+        :param attach:bool attach a session to the running Chrome, if False every session launches its own Chrome
+        :param state_file:str
+        """
+        self.port = port
+        self.debug_port = debug_port
+        self.attach = attach
+        self.state_file = state_file
+        self._attach_lock = threading.Lock()
+        self._attached_session = None
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.port}'
+
+    def _ok(self, url: str) -> bool:
+        try:
+            return requests.get(url, timeout=2).ok
+        except requests.RequestException:
+            return False
+
+    def driver_healthy(self) -> bool:
+        try:
+            return bool(requests.get(self.url + '/status', timeout=2).json()['value']['ready'])
+        except (requests.RequestException, ValueError, KeyError, TypeError):
+            return False
+
+    def chrome_healthy(self) -> bool:
+        return self._ok(f'http://127.0.0.1:{self.debug_port}/json/version')
+
+    def healthy(self) -> bool:
+        return self.driver_healthy() and self.chrome_healthy()
+
+    def touch(self):
+        try:
+            os.utime(self.state_file)
+        except OSError as e:
+            log.debug('Could not touch %s: %r', self.state_file, e)
+
+    @classmethod
+    def running(cls, state_file: str = STATE_FILE, attach: bool = True) -> 'BrowserService':
+        """
+        :return: client of the running healthy service, None if there is none
+        """
+        try:
+            with open(state_file) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        service = cls(state['port'], state['debug_port'], attach=attach, state_file=state_file)
+        return service if service.healthy() else None
+
+    @classmethod
+    def ensure(cls, headless: bool = False, idle_timeout: float = 1800, driver_path: str = None,
+               chrome_binary: str = None, attach: bool = True, state_file: str = STATE_FILE,
+               timeout: float = 60) -> 'BrowserService':
+        """
+        Client of the running service. If there is none, the supervisor is started in background.
+        :raise TimeoutError: if the service is not healthy in timeout seconds
+        """
+        service = cls.running(state_file, attach)
+        if service is not None:
+            return service
+
+        # pytest-xdist workers call this at the same time, only the one holding the lock starts the supervisor
+        os.makedirs(os.path.dirname(state_file) or '.', exist_ok=True)
+        log_path = os.path.splitext(state_file)[0] + '.log'
+        lock_file = state_file + '.lock'
+        try:
+            if os.path.exists(lock_file) and time.time() - os.path.getmtime(lock_file) > timeout:
+                os.remove(lock_file)  # left by a run which was killed while starting the service
+            os.close(os.open(lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            starting = True
+        except FileExistsError:
+            starting = False
+            log.info('Browser service is being started by another process, waiting for it')
+
+        try:
+            if starting:
+                command = [sys.executable, '-m', 'pom.service', 'start', '--idle-timeout', str(idle_timeout),
+                           '--state-file', state_file]
+                command += ['--headless'] if headless else []
+                command += ['--chromedriver-path', driver_path] if driver_path else []
+                command += ['--chrome-binary', chrome_binary] if chrome_binary else []
+                log.info('Starting browser service, log: %s', log_path)
+                with open(log_path, 'a') as service_log:
+                    detached = {'creationflags': subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP} \
+                        if os.name == 'nt' else {'start_new_session': True}
+                    subprocess.Popen(command, stdout=service_log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                                     cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), **detached)
+
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                service = cls.running(state_file, attach)
+                if service is not None:
+                    return service
+                time.sleep(0.2)
+            raise TimeoutError(f'Browser service did not start in {timeout}s, see {log_path}')
+        finally:
+            if starting:
+                os.remove(lock_file)
+
+    def session(self, options: Options):
+        """
+        New session of the service. The first concurrent one is attached to the running Chrome.
+        :param options:Options of the session, launch arguments do not apply to the attached Chrome
+        :return: webdriver.Remote
+        """
+        self.touch()
+        if self.attach and self._attach_lock.acquire(blocking=False):
+            options.debugger_address = f'127.0.0.1:{self.debug_port}'
+            try:
+                driver = webdriver.Remote(command_executor=self.url, options=options)
+            except Exception:
+                self._attach_lock.release()
+                raise
+            self._attached_session = driver.session_id
+            log.debug('Session %s attached to Chrome on port %s', driver.session_id, self.debug_port)
+            return driver
+
+        return webdriver.Remote(command_executor=self.url, options=options)
+
+    def release(self, session_id: str):
+        """
+        The session has quit, the running Chrome can be attached again.
+        """
+        self.touch()
+        if session_id is not None and session_id == self._attached_session:
+            self._attached_session = None
+            self._attach_lock.release()
+
+    def stop(self):
+        """
+        Ask the supervisor to shut down.
+        """
+        open(self.state_file + '.stop', 'w').close()
+
+
+def serve(port: int = 9515, debug_port: int = 9222, headless: bool = False, idle_timeout: float = 1800,
+          driver_path: str = None, chrome_binary: str = None, state_file: str = STATE_FILE):
+    """
+    Supervisor: keeps chromedriver and Chrome running, restarts whichever fails its health check,
+    and stops both after idle_timeout seconds without sessions or when a stop is requested.
+    """
+    from pom import resolve_chromedriver
+
+    driver_command = [resolve_chromedriver(path=driver_path), f'--port={port}']
+    profile = os.path.join(os.path.dirname(state_file) or '.', 'noneqa-browser-profile')
+    chrome_command = [chrome_binary or find_chrome(), f'--remote-debugging-port={debug_port}',
+                      f'--user-data-dir={profile}', '--no-first-run', '--no-default-browser-check']
+    chrome_command += ['--headless=new', '--window-size=1920,1080'] if headless else ['--start-maximized']
+    chrome_command += ['about:blank']
+
+    service = BrowserService(port, debug_port, state_file=state_file)
+    stop_file = state_file + '.stop'
+    if os.path.exists(stop_file):
+        os.remove(stop_file)
+    processes = {}
+
+    def start(name: str, command: list, healthy) -> subprocess.Popen:
+        """
+        :raise RuntimeError: if the process is not healthy in 30 seconds, e.g. its port is taken
+        """
+        process = processes.get(name)
+        if process is not None and process.poll() is None:
+            process.terminate()
+            process.wait(10)
+        process = processes[name] = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 30
+        while not healthy():
+            if process.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError(f'{name} is not healthy, exit code {process.poll()}: {" ".join(command)}')
+            time.sleep(0.2)
+        log.info('%s started, pid %s', name, process.pid)
+        return process
+
+    try:
+        start('chromedriver', driver_command, service.driver_healthy)
+        start('chrome', chrome_command, service.chrome_healthy)
+        os.makedirs(os.path.dirname(state_file) or '.', exist_ok=True)
+        with open(state_file, 'w') as f:
+            json.dump({'pid': os.getpid(), 'port': port, 'debug_port': debug_port, 'headless': headless,
+                       'started': time.time()}, f)
+        log.info('Browser service is ready: chromedriver %s, Chrome debugging port %s', service.url, debug_port)
+
+        checked = time.monotonic()
+        while not os.path.exists(stop_file):
+            time.sleep(1)
+            if time.monotonic() - checked < HEALTH_INTERVAL:
+                continue
+            checked = time.monotonic()
+
+            if processes['chromedriver'].poll() is not None or not service.driver_healthy():
+                log.warning('chromedriver is not healthy, restarting')
+                start('chromedriver', driver_command, service.driver_healthy)
+            if processes['chrome'].poll() is not None or not service.chrome_healthy():
+                log.warning('Chrome is not healthy, restarting')
+                start('chrome', chrome_command, service.chrome_healthy)
+
+            try:
+                sessions = requests.get(service.url + '/sessions', timeout=2).json().get('value') or []
+            except (requests.RequestException, ValueError, AttributeError):
+                sessions = []
+            if sessions:
+                service.touch()
+            elif time.time() - os.path.getmtime(state_file) > idle_timeout:
+                log.info('No sessions for %ss, shutting down', idle_timeout)
+                break
+    finally:
+        for name, process in processes.items():
+            if process.poll() is None:
+                process.terminate()
+                try:
+                    process.wait(10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+            log.info('%s stopped', name)
+        try:
+            with open(state_file) as f:
+                own_state = json.load(f)['pid'] == os.getpid()
+        except (OSError, ValueError, KeyError):
+            own_state = False
+        for path in (state_file, stop_file) if own_state else (stop_file,):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Long-lived local chromedriver and Chrome for test runs')
+    parser.add_argument('command', choices=['start', 'stop', 'status'])
+    parser.add_argument('--port', type=int, default=9515, help='chromedriver port. default: %(default)s')
+    parser.add_argument('--debug-port', type=int, default=9222,
+                        help='Chrome remote debugging port. default: %(default)s')
+    parser.add_argument('--headless', action='store_true')
+    parser.add_argument('--idle-timeout', type=float, default=1800,
+                        help='seconds without sessions before the service stops. default: %(default)s')
+    parser.add_argument('--chromedriver-path', help='chromedriver binary, default is resolved like for test runs')
+    parser.add_argument('--chrome-binary', help='Chrome binary, default is searched in PATH')
+    parser.add_argument('--state-file', default=STATE_FILE, help='default: %(default)s')
+    args = parser.parse_args()
+    logger.configure()
+
+    running = BrowserService.running(args.state_file)
+    if args.command == 'start':
+        if running is not None:
+            print(f'Browser service is already running at {running.url}')
+        else:
+            serve(args.port, args.debug_port, args.headless, args.idle_timeout, args.chromedriver_path,
+                  args.chrome_binary, args.state_file)
+    elif args.command == 'stop':
+        if running is None:
+            print('Browser service is not running')
+        else:
+            running.stop()
+            print('Browser service is stopping')
+    else:
+        print(f'Browser service is running at {running.url}' if running else 'Browser service is not running')
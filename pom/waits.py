@@ -0,0 +1,147 @@
+import time
+from contextlib import contextmanager
+
+from selenium.common.exceptions import StaleElementReferenceException, TimeoutException
+from selenium.webdriver.remote.webelement import WebElement
+from selenium.webdriver.support import expected_conditions as ec
+from selenium.webdriver.support.ui import WebDriverWait
+
+import logger
+
+log = logger.get_logger(__name__, 'INFO')
+
+
+class Waits:
+    """
+    Explicit condition-based waits.
+    Implicit wait is switched off while a condition is polled, otherwise every miss inside a condition
+    would block for the whole implicit wait instead of one poll interval.
+    """
+
+    def __init__(self, driver, implicit_wait: float = 0, timeout: float = 10, poll: float = 0.1):
+        """
+        :param driver:WebDriver
+        :param implicit_wait:float implicit wait configured for the driver, restored after each wait
+        :param timeout:float default timeout of explicit waits, seconds
+        :param poll:float poll interval, seconds
+        """
+        self.driver = driver
+        self.implicit_wait = implicit_wait
+        self.timeout = timeout
+        self.poll = poll
+
+    @contextmanager
+    def no_implicit_wait(self):
+        """
+        Lookups inside the block return or raise immediately.
+        """
+        if not self.implicit_wait:
+            yield
+            return
+        self.driver.implicitly_wait(0)
+        try:
+            yield
+        finally:
+            self.driver.implicitly_wait(self.implicit_wait)
+
+    def _until(self, condition, timeout: float = None, message: str = ''):
+        with self.no_implicit_wait():
+            return WebDriverWait(self.driver,
+                                 self.timeout if timeout is None else timeout,
+                                 poll_frequency=self.poll).until(condition, message)
+
+    def find_optional(self, locator: dict, parent=None) -> WebElement:
+        """
+        Zero-wait lookup for an element which may legitimately be missing.
+        :param locator:dict with 'by' and 'value' keys
+        :param parent:WebElement to search in, default is the whole document
+        :return: WebElement or None
+        """
+        with self.no_implicit_wait():
+            elements = (parent or self.driver).find_elements(**locator)
+        return elements[0] if elements else None
+
+    def present(self, locator: dict, timeout: float = None) -> WebElement:
+        """
+        Wait for an element to be in DOM.
+        :raise TimeoutException:
+        """
+        return self._until(ec.presence_of_element_located((locator['by'], locator['value'])), timeout,
+                           f'{locator} is not present')
+
+    def absent(self, locator: dict, timeout: float = None) -> bool:
+        """
+        Wait for no element matching locator in DOM. Returns at once if there is none already.
+        :return: True if absent, False if still present after timeout
+        """
+        try:
+            return self._until(lambda driver: not driver.find_elements(**locator), timeout)
+        except TimeoutException:
+            return False
+
+    def stale(self, element: WebElement, timeout: float = None) -> bool:
+        """
+        Wait for an element to be removed from DOM, e.g. by page reload or React re-render.
+        :raise TimeoutException:
+        """
+        return self._until(ec.staleness_of(element), timeout, 'element is not stale')
+
+    def text_changed(self, locator: dict, old_text: str, timeout: float = None) -> str:
+        """
+        Wait for text of the element to be different from old_text.
+        :return: the new text
+        :raise TimeoutException:
+        """
+        def changed(driver):
+            try:
+                elements = driver.find_elements(**locator)
+                return elements and elements[0].text != old_text and elements[0].text
+            except StaleElementReferenceException:
+                return False
+
+        return self._until(changed, timeout, f'text of {locator} is still {old_text!r}')
+
+    def rows_settled(self, locator: dict, expected: int = None, settle: float = 0.3, empty_settle: float = 1.0,
+                     timeout: float = None) -> int:
+        """
+        Wait for the number of elements to reach expected or, if it is not known,
+        not to change for settle seconds (the list is filled by async requests after render).
+        No elements settle after empty_settle seconds, a list which is still loading is empty too.
+        Pass expected=0 for a list which should be empty.
+        :return: number of elements
+        :raise TimeoutException:
+        """
+        state = {'count': None, 'since': None}
+
+        def settled(driver):
+            count = len(driver.find_elements(**locator))
+            if expected is not None:
+                return count == expected
+            now = time.monotonic()
+            if count != state['count']:
+                state['count'], state['since'] = count, now
+                return False
+            return now - state['since'] >= (settle if count else empty_settle)
+
+        self._until(settled, timeout, f'number of {locator} did not settle')
+        return state['count'] if expected is None else expected
+
+    def list_rerendered(self, old_list: WebElement, list_locator: dict, row_locator: dict,
+                        expected: int = None, timeout: float = None) -> WebElement:
+        """
+        Wait for a list to be rendered again after driver.refresh() or navigation:
+        the old list element is gone, a new one is in DOM and its rows are settled.
+        :param old_list:WebElement list element taken before refresh, None to skip the staleness check
+        :param list_locator:dict locator of the list element
+        :param row_locator:dict locator of the list rows
+        :param expected:int expected number of rows if known
+        :return: the new list element
+        :raise TimeoutException:
+        """
+        if old_list is not None:
+            self.stale(old_list, timeout)
+        new_list = self.present(list_locator, timeout)
+        self.rows_settled(row_locator, expected, timeout=timeout)
+        log.debug('List %s re-rendered', list_locator)
+
+        return new_list
@@ -0,0 +1,147 @@
+"""
+Deterministic bulk test data.
+
+    ledger = DeviceLedger('testresults/ledger.jsonl')
+    seed_devices(api, generate_devices(10000, seed=1), ledger)
+    ...
+    ledger.cleanup(api)
+"""
+import json
+import os
+import random
+import threading
+
+from api.devices import Device, DevicesAPI
+from testdata import device_props
+import logger
+
+log = logger.get_logger(__name__)
+
+
+def generate_devices(count: int, seed: int = 0, prefix: str = '') -> list:
+    """
+    The same seed and count give the same devices. Names are unique, the running number is part of the name.
+    :param count:int number of devices
+    :param seed:int random seed
+    :param prefix:str prepended to every system name
+    :return: list of Device without id
+    """
+    rng = random.Random(seed)
+    width = len(str(max(count - 1, 0)))
+    devices = []
+    for number in range(count):
+        name = '-'.join([rng.choice(device_props.first_names).upper(),
+                         rng.choice(device_props.size_matters).upper(),
+                         rng.choice(device_props.platforms).upper(),
+                         f'{number:0{width}d}'])
+        devices.append(Device(system_name=prefix + name,
+                              type=rng.choice(device_props.device_types),
+                              hdd_capacity=str(2 ** rng.randint(7, 12))))
+    return devices
+
+
+class DeviceLedger:
+    """
+    Ids of devices created by the tests, so they can be deleted at the end of the session.
+    With path every change is appended to a JSON lines journal, ids left by an interrupted run
+    are loaded and deleted by the next cleanup.
+    """
+
+    def __init__(self, path: str = None):
+        """
+        :param path:str journal file, the ledger is kept in memory only if empty
+        """
+        self.path = path
+        self._ids = {}  # ordered set
+        self._lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            with open(path) as journal:
+                for line in journal:
+                    entry = json.loads(line)
+                    self._apply(entry['op'], entry['ids'])
+            if self._ids:
+                log.info('%s devices left by a previous run are in the ledger %s', len(self._ids), path)
+
+    def _apply(self, op: str, ids: list):
+        if op == 'add':
+            self._ids.update(dict.fromkeys(ids))
+        else:
+            for device_id in ids:
+                self._ids.pop(device_id, None)
+
+    def _write(self, op: str, ids: list):
+        with self._lock:
+            self._apply(op, ids)
+            if self.path:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                with open(self.path, 'a') as journal:
+                    journal.write(json.dumps({'op': op, 'ids': ids}) + '\n')
+
+    def add(self, device_ids: list):
+        self._write('add', [device_id for device_id in device_ids if device_id is not None])
+
+    def discard(self, device_ids: list):
+        self._write('discard', list(device_ids))
+
+    @property
+    def ids(self) -> list:
+        with self._lock:
+            return list(self._ids)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, device_id):
+        return device_id in self._ids
+
+    def cleanup(self, api: DevicesAPI, concurrency: int = None) -> list:
+        """
+        Delete all recorded devices in parallel. Devices which could not be deleted stay in the ledger.
+        :param api:DevicesAPI
+        :param concurrency:int max number of parallel requests, default is api.concurrency
+        :return: ids which were not deleted
+        """
+        ids = self.ids
+        if not ids:
+            return []
+
+        log.info('Deleting %s devices created by the tests', len(ids))
+        result = api.delete_devices(ids, concurrency)
+        failed = [ids[index] for index in result.errors]
+        if failed:
+            log.error('%s devices were not deleted, they stay in the ledger: %s', len(failed), failed[:10])
+
+        with self._lock:
+            self._apply('discard', set(ids).difference(failed))
+            if self.path:
+                # compact the journal to what is left
+                with open(self.path, 'w') as journal:
+                    if self._ids:
+                        journal.write(json.dumps({'op': 'add', 'ids': list(self._ids)}) + '\n')
+        return failed
+
+
+def seed_devices(api: DevicesAPI, devices: list, ledger: DeviceLedger, batch_size: int = 1000,
+                 concurrency: int = None) -> list:
+    """
+    Create devices concurrently and record their ids in the ledger batch by batch,
+    so devices of an interrupted seeding are cleaned up as well.
+    :param api:DevicesAPI
+    :param devices:list of Device
+    :param ledger:DeviceLedger
+    :param batch_size:int number of devices recorded at once
+    :param concurrency:int max number of parallel requests, default is api.concurrency
+    :return: list of created device dictionaries in the order of devices
+    """
+    log.info('Seeding %s devices', len(devices))
+    created = []
+    for start in range(0, len(devices), batch_size):
+        result = api.add_devices(devices[start:start + batch_size], concurrency)
+        added = [device for device in result.results if isinstance(device, dict)]
+        ledger.add([device.get('id') for device in added])
+        created.extend(added)
+        if not result.ok:
+            raise RuntimeError(f'{len(result.errors)} devices were not created, '
+                               f'first error: {next(iter(result.errors.values()))!r}')
+    return created
@@ -0,0 +1,218 @@
+import os
+
+import pytest
+
+from api.cache import HTTPCache
+from api.devices import DevicesAPI
+from api.fake_server import FakeDevicesServer
+from api.index import DeviceIndex
+from api.namespace import Namespace
+from db import TimingRecorder
+from plugins.budget import LatencyBudgets, parse_budgets
+from plugins.profiler import TraceProfiler
+from pom import WebDriverSetup
+from pom.navigator import DevicesUI
+from pom.perf import PerfRecorder
+from pom.pool import DriverPool
+from pom.service import BrowserService
+from testdata.seeding import DeviceLedger, generate_devices, seed_devices
+import config
+import logger
+
+parser = config.parser
+parser.add_argument('--ui-url', help='URL to client app', env_var='UI_URL')
+parser.add_argument('--api-url', help='URL to server app', env_var='API_URL')
+parser.add_argument('--implicit-wait', type=str, default=10,
+                    help='The web driver to wait for a certain amount of time '
+                         'before it throws a "No Such Element Exception". Default: %(default)s',
+                    env_var='IMP_WAIT')
+parser.add_argument('--browser-pool-size', type=int, default=1, env_var='BROWSER_POOL_SIZE',
+                    help='max number of browsers per test process (per pytest-xdist worker). default: %(default)s')
+parser.add_argument('--headless', action='store_true', env_var='HEADLESS', help='run browsers without a window')
+parser.add_argument('--chromedriver-version', env_var='CHROMEDRIVER_VERSION',
+                    help='chromedriver version to pin, it is downloaded once and then used offline. default: latest')
+parser.add_argument('--perf-file', env_var='PERF_FILE',
+                    help='JSON lines file to save front-end metrics of UI actions to, '
+                         'e.g. testresults/perf.jsonl. Metrics are not collected if empty.')
+parser.add_argument('--chromedriver-path', env_var='CHROMEDRIVER_PATH',
+                    help='chromedriver binary to use as is')
+parser.add_argument('--api-budgets', env_var='API_BUDGETS', default='',
+                    help='latency budgets of endpoints for the whole run, '
+                         'e.g. GET /devices=p95:500,DELETE /devices/{id}=300')
+parser.add_argument('--ui-budgets', env_var='UI_BUDGETS', default='',
+                    help='latency budgets of UI actions for the whole run, e.g. open_ui=max:5000,add_device=p95:3000')
+parser.add_argument('--trace-file', env_var='TRACE_FILE',
+                    help='save time breakdown of every test (API, WebDriver, waits, local) '
+                         'in Chrome Trace Event format, e.g. testresults/trace.json')
+parser.add_argument('--namespace', env_var='NAMESPACE', default='',
+                    help='isolate the run on a shared backend: devices are named with a prefix unique per run and '
+                         'pytest-xdist worker, tests see and change only them. "auto" generates the prefix, '
+                         'other values are used as its base. Not isolated if empty.')
+parser.add_argument('--seed-devices', type=int, default=0, env_var='SEED_DEVICES',
+                    help='number of devices to create before the UI tests, they are deleted at the end of the session. '
+                         'default: %(default)s')
+parser.add_argument('--data-seed', type=int, default=0, env_var='DATA_SEED',
+                    help='random seed of generated devices, the same seed gives the same devices. default: %(default)s')
+parser.add_argument('--ledger-file', env_var='LEDGER_FILE',
+                    help='journal of devices created by the tests, e.g. testresults/ledger.jsonl. Devices left by '
+                         'an interrupted run are deleted by the next one. Kept in memory only if empty.')
+parser.add_argument('--browser-service', env_var='BROWSER_SERVICE', default='', choices=['', 'auto'],
+                    help='"auto" creates browser sessions in the long-lived local chromedriver and Chrome of '
+                         'python -m pom.service, which is started in background if it is not running '
+                         'and stops after --browser-service-idle seconds without sessions. Browsers are launched '
+                         'by every run if empty.')
+parser.add_argument('--browser-service-idle', type=float, default=1800, env_var='BROWSER_SERVICE_IDLE',
+                    help='seconds without sessions before the browser service stops. default: %(default)s')
+parser.add_argument('--budget-mode', env_var='BUDGET_MODE', default='fail', choices=['fail', 'warn', 'off'],
+                    help='what an exceeded latency budget does. default: %(default)s')
+
+NAMESPACE_DEVICES = 10
+
+# nothing is created at import, so collection and API-only runs do not start a browser or call the server.
+
+
+def pytest_configure(config):
+    parsed, _ = parser.parse_known_args()
+    # pytest live logging prints records already, the listener only writes the JSON file if it is configured
+    logger.configure(default_level=parsed.log_level, levels=parsed.log_levels, console=False,
+                     json_file=parsed.log_json_file)
+
+    config.addinivalue_line('markers', 'budget(p95_ms=..., endpoint=..., action=...): latency budget of the test, '
+                                       'see plugins/budget.py')
+    if parsed.budget_mode != 'off':
+        budgets = parse_budgets(parsed.api_budgets, 'api') + parse_budgets(parsed.ui_budgets, 'ui')
+        plugin = LatencyBudgets(config, budgets, mode=parsed.budget_mode)
+        plugin.register()
+        config.pluginmanager.register(plugin, 'latency_budgets')
+    if parsed.trace_file:
+        profiler = TraceProfiler(config, parsed.trace_file)
+        profiler.register()
+        config.pluginmanager.register(profiler, 'trace_profiler')
+
+
+def pytest_unconfigure(config):
+    for name in ('latency_budgets', 'trace_profiler'):
+        plugin = config.pluginmanager.get_plugin(name)
+        if plugin is not None:
+            plugin.unregister()
+
+
+@pytest.fixture(scope='session')
+def cfg():
+    parsed, _ = parser.parse_known_args()
+    logger.get_logger(__name__, parsed.log_level).info(parsed)
+    return parsed
+
+
+@pytest.fixture(scope='session')
+def namespace(cfg) -> Namespace:
+    if not cfg.namespace:
+        return Namespace()
+    isolated = Namespace.create(cfg.namespace, os.environ.get('PYTEST_XDIST_WORKER'))
+    logger.get_logger(__name__, cfg.log_level).info('Tests run in namespace %s', isolated.prefix)
+    return isolated
+
+
+@pytest.fixture
+def fake_server():
+    """
+    In-process devices server with 50 generated devices, for tests of the API client and test tooling.
+    """
+    with FakeDevicesServer(devices=50, seed=1) as server:
+        yield server
+
+
+@pytest.fixture
+def fake_api(fake_server):
+    with DevicesAPI(base_url=fake_server.base_url, pool_maxsize=4, concurrency=4) as devices_api:
+        yield devices_api
+
+
+@pytest.fixture(scope='session')
+def api(cfg, namespace):
+    devices_api = DevicesAPI(base_url=cfg.api_url,
+                             pool_connections=cfg.api_pool_connections,
+                             pool_maxsize=cfg.api_pool_maxsize,
+                             concurrency=cfg.api_concurrency,
+                             retries=cfg.api_retries,
+                             backoff=cfg.api_backoff,
+                             hedge=cfg.api_hedge,
+                             breaker_threshold=cfg.api_breaker_threshold,
+                             breaker_reset=cfg.api_breaker_reset)
+    if cfg.api_cache_ttl:
+        devices_api.index = DeviceIndex(ttl=cfg.api_cache_ttl)
+    devices_api.namespace = namespace
+    if cfg.api_http_cache:
+        devices_api.cache = HTTPCache(maxsize=cfg.api_http_cache, path=cfg.api_http_cache_file)
+    if cfg.timings_db:
+        devices_api.recorder = TimingRecorder(path=cfg.timings_db, run_id=cfg.run_id)
+
+    yield devices_api
+
+    if any(devices_api.counters.values()):
+        logger.get_logger(__name__, cfg.log_level).info('API resilience counters: %s', dict(devices_api.counters))
+    if devices_api.recorder is not None:
+        devices_api.recorder.close()
+    devices_api.close()
+
+
+@pytest.fixture(scope='session')
+def ledger(cfg, api):
+    """
+    Ids of devices created by the tests, all of them are deleted in parallel at the end of the session.
+    """
+    path = cfg.ledger_file
+    worker = os.environ.get('PYTEST_XDIST_WORKER')
+    if path and worker:
+        path = '-{}'.format(worker).join(os.path.splitext(path))  # one journal per pytest-xdist worker
+    device_ledger = DeviceLedger(path)
+
+    yield device_ledger
+
+    device_ledger.cleanup(api)
+
+
+@pytest.fixture(scope='session')
+def seeded_devices(cfg, api, ledger, namespace) -> list:
+    """
+    seed-devices devices generated from data-seed and created via API, in every test process.
+    An isolated namespace starts empty, so at least NAMESPACE_DEVICES are created in it.
+    """
+    count = max(cfg.seed_devices, NAMESPACE_DEVICES if namespace.prefix else 0)
+    if not count:
+        return []
+    return seed_devices(api, generate_devices(count, seed=cfg.data_seed, prefix=namespace.prefix), ledger)
+
+
+@pytest.fixture(scope='session')
+def driver_pool(cfg):
+    WebDriverSetup.driver_version = cfg.chromedriver_version
+    WebDriverSetup.driver_path = cfg.chromedriver_path
+    if cfg.browser_service:
+        # one session at a time attaches to the running Chrome, parallel ones get their own
+        WebDriverSetup.service = BrowserService.ensure(headless=cfg.headless,
+                                                       idle_timeout=cfg.browser_service_idle,
+                                                       driver_path=cfg.chromedriver_path,
+                                                       attach=cfg.browser_pool_size == 1
+                                                       and 'PYTEST_XDIST_WORKER' not in os.environ)
+    if cfg.perf_file:
+        DevicesUI.perf = PerfRecorder(path=cfg.perf_file, run_id=cfg.run_id)
+    pool = DriverPool.shared(size=cfg.browser_pool_size,
+                             browser='Chrome',
+                             implicit_wait=cfg.implicit_wait,
+                             headless=cfg.headless)
+    yield pool
+    pool.close()
+
+
+@pytest.fixture(scope='class')
+def ui(cfg, driver_pool, seeded_devices, namespace):
+    """
+    Browser checked out of the pool with the client app opened. It is reset and returned to the pool
+    after the test class, so tests of one class share the page state, run classes together with
+    pytest-xdist: python -m pytest -n auto --dist loadscope
+    """
+    with driver_pool.driver() as setup:
+        devices_ui = DevicesUI(url=cfg.ui_url, setup=setup)
+        devices_ui.namespace = namespace
+        yield devices_ui
@@ -0,0 +1,36 @@
+import pytest
+
+from api import RequestTiming
+from plugins.budget import Budget, LatencyBudgets, parse_budgets
+
+
+def timing(method: str, template: str, elapsed: float) -> RequestTiming:
+    return RequestTiming(method=method, url=template, template=template, status=200, nbytes=0, elapsed=elapsed,
+                         started=0)
+
+
+class TestBudgets(object):
+
+    def test_parse_config(self):
+        budgets = parse_budgets('GET /devices=p99:500, GET /devices/{id}=200', 'api')
+
+        assert budgets == [Budget('api:GET /devices', 'p99', 500), Budget('api:GET /devices/{id}', 'p95', 200)]
+        with pytest.raises(ValueError):
+            parse_budgets('open_ui=p42:100', 'ui')
+
+    def test_check_samples(self, pytestconfig):
+        plugin = LatencyBudgets(pytestconfig, parse_budgets('GET /devices/{id}=p95:100,DELETE /devices/{id}=100', 'api'))
+        for elapsed in [0.01] * 19 + [0.5]:
+            plugin.add_request(timing('GET', '/devices/{id}', elapsed))
+        plugin.add_request(timing('DELETE', '/devices/{id}', 0.2))
+
+        get, delete = plugin.check_session()
+        assert (get.count, get.value_ms, get.exceeded) == (20, 10, False)
+        assert (delete.count, delete.value_ms, delete.exceeded) == (1, 200, True)
+
+    def test_marker_without_scope_covers_all_requests(self):
+        budget, = Budget.from_marker(pytest.mark.budget(max_ms=300).mark)
+        samples = {'api:GET /devices': [0.1], 'api:PUT /devices/{id}': [0.4], 'ui:open_ui': [2.0]}
+
+        result = budget.check(samples)
+        assert (result.count, result.value_ms, result.exceeded) == (2, 400, True)
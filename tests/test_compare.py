@@ -0,0 +1,43 @@
+import time
+
+from compare import diff_devices, normalise_device
+
+
+class TestDiffDevices(object):
+    """
+    Keyed comparison of device lists from API and UI.
+    """
+
+    def test_known_quirks_normalised(self):
+        ui_device = {'id': '1', 'system_name': 'A', 'type': 'WINDOWS WORKSTATION', 'hdd_capacity': '128 GB',
+                     'edit': True, 'remove': True, 'displayed': True}
+
+        assert normalise_device(ui_device) == {'system_name': 'A', 'type': 'WINDOWS_WORKSTATION', 'hdd_capacity': '128'}
+        assert diff_devices([{'id': '1', 'system_name': 'A', 'type': 'WINDOWS_WORKSTATION', 'hdd_capacity': '128'}],
+                            [ui_device]).ok
+
+    def test_missing_extra_and_mismatch(self):
+        expected = [{'id': '1', 'system_name': 'A', 'type': 'MAC', 'hdd_capacity': '64'},
+                    {'id': '2', 'system_name': 'B', 'type': 'MAC', 'hdd_capacity': '64'}]
+        actual = [{'id': '2', 'system_name': 'C', 'type': 'MAC', 'hdd_capacity': '64'},
+                  {'id': '3', 'system_name': 'D', 'type': 'MAC', 'hdd_capacity': '64'}]
+
+        diff = diff_devices(expected, actual)
+
+        assert [d['id'] for d in diff.missing] == ['1']
+        assert [d['id'] for d in diff.extra] == ['3']
+        assert [(m.key, m.field, m.expected, m.actual) for m in diff.mismatches] == [('2', 'system_name', 'B', 'C')]
+
+    def test_keyless_records_matched_by_content(self):
+        record = {'system_name': 'A', 'type': 'MAC', 'hdd_capacity': '64'}
+
+        assert diff_devices([record], [dict(record, id=None)]).ok
+        assert len(diff_devices([record, record], [record]).missing) == 1
+
+    def test_large_lists_linear(self):
+        expected = [{'id': str(i), 'system_name': f'N{i}', 'type': 'MAC', 'hdd_capacity': '64'} for i in range(100000)]
+        actual = [dict(d, hdd_capacity='64 GB') for d in reversed(expected)]
+
+        started = time.monotonic()
+        assert diff_devices(expected, actual).ok
+        assert time.monotonic() - started < 5
@@ -0,0 +1,264 @@
+import json
+import sqlite3
+import time
+from unittest import mock
+
+import pytest
+import requests
+
+from api import iter_json_array
+from api.cache import HTTPCache
+from api.devices import DevicesAPI, Device
+from api.fake_server import FakeDevicesServer
+from api.index import DeviceIndex
+from api.load import LoadGenerator
+from api.namespace import Namespace
+from api.resilience import CircuitOpenError
+
+
+class TestConnectionPool(object):
+    """
+    Requests reuse keep-alive connections instead of opening one per call.
+    """
+
+    @pytest.mark.budget(p95_ms=500, endpoint='GET /devices/{id}')
+    def test_sequential_requests_reuse_connection(self, fake_server, fake_api):
+        for device in fake_api.get_devices()[:10]:
+            fake_api.get_device_by_id(device['id'])
+
+        assert fake_server.counters['requests'] == 11
+        assert fake_server.counters['connections'] == 1
+
+    def test_bulk_requests_bounded_by_pool(self, fake_server, fake_api):
+        result = fake_api.get_devices_by_ids([d['id'] for d in fake_api.get_devices()])
+
+        assert result.ok
+        assert fake_server.counters['connections'] <= 4
+
+
+class TestBulk(object):
+
+    def test_results_ordered(self, fake_api):
+        ids = [d['id'] for d in fake_api.get_devices()][::-1]
+        result = fake_api.get_devices_by_ids(ids)
+
+        assert [d['id'] for d in result.results] == ids
+
+    def test_errors_collected_per_item(self, fake_server, fake_api):
+        devices = [Device(system_name=f'BULK-{i}', type='MAC', hdd_capacity='64') for i in range(8)]
+        added = fake_api.add_devices(devices)
+        assert added.ok
+        assert [d['system_name'] for d in added.results] == [d.system_name for d in devices]
+
+        fake_server.error_rate = 0.5
+        result = fake_api.delete_devices([d['id'] for d in added.results])
+        fake_server.error_rate = 0
+
+        assert result.errors
+        assert all(isinstance(e, requests.HTTPError) for e in result.errors.values())
+        assert all(result.results[i] is None for i in result.errors)
+        assert len(fake_api.get_devices()) == 50 + len(result.errors)
+
+        missing = fake_api.get_devices_by_ids(['missing'])
+        assert missing.errors[0].response.status_code == 404
+        assert not fake_api.raise_for_status
+        assert 'error' in fake_api.delete_device('missing')  # single calls keep returning the body
+
+
+class TestStreaming(object):
+
+    def test_iter_devices_matches_list(self, fake_api):
+        assert [d.__dict__ for d in fake_api.iter_devices()] == fake_api.get_devices()
+
+    def test_items_split_across_chunks(self):
+        text = '[-35000000000.0, 1e-7, 12, true, null, "a,]", {"id": [1, 2.5]}, [], -0.5E+3]'
+        expected = json.loads(text)
+
+        assert list(iter_json_array(text)) == expected  # one character per chunk
+        for split in range(len(text) + 1):
+            assert list(iter_json_array([text[:split], text[split:]])) == expected, split
+
+
+class TestDeviceIndex(object):
+
+    def test_lookups_served_from_index(self, fake_server, fake_api):
+        fake_api.index = DeviceIndex(ttl=60)
+        devices = fake_api.get_devices()
+        requests_before = fake_server.counters['requests']
+
+        for device in devices:
+            assert fake_api.get_device_by_id(device['id']) == device
+            assert device in fake_api.get_device_by_name(device['system_name'])
+
+        assert fake_server.counters['requests'] == requests_before
+
+    def test_write_through(self, fake_server, fake_api):
+        fake_api.index = DeviceIndex(ttl=60)
+        fake_api.get_devices()
+
+        added = fake_api.add_device(Device(system_name='INDEXED', type='MAC', hdd_capacity='128'))
+        fake_api.update_device(Device(id=added['id'], system_name='RENAMED', type='MAC', hdd_capacity='128'))
+        requests_before = fake_server.counters['requests']
+
+        assert fake_api.get_device_by_name('RENAMED')[0]['id'] == added['id']
+        assert fake_server.counters['requests'] == requests_before
+
+        fake_api.delete_device(added['id'])
+        assert fake_api.get_device_by_name('RENAMED') == []
+
+    def test_failed_writes_keep_index(self, fake_server, fake_api):
+        fake_api.index = DeviceIndex(ttl=60)
+        device = fake_api.get_devices()[0]
+        fake_server.error_rate = 1
+
+        fake_api.update_device(Device(id=device['id'], system_name='RENAMED', type='MAC', hdd_capacity='128'))
+        fake_api.delete_device(device['id'])
+        fake_api.add_device(Device(system_name='FAILED', type='MAC', hdd_capacity='128'))
+
+        assert fake_api.index.get(device['id']) == device
+        assert fake_api.index.find_by_name('RENAMED') == fake_api.index.find_by_name('FAILED') == []
+
+
+class TestResilience(object):
+
+    def test_idempotent_requests_retried(self, fake_server):
+        with DevicesAPI(base_url=fake_server.base_url, retries=5, backoff=0.001) as devices_api:
+            ids = [d['id'] for d in devices_api.get_devices()][:20]
+            fake_server.error_rate = 0.3
+            devices = [devices_api.get_device_by_id(device_id) for device_id in ids]
+            requests_before = fake_server.counters['requests']
+            fake_server.error_rate = 1
+            added = devices_api.add_device(Device(system_name='RETRY', type='MAC', hdd_capacity='64'))
+
+        assert [d['id'] for d in devices] == ids
+        assert devices_api.counters['retries'] > 0
+        assert 'error' in added and fake_server.counters['requests'] == requests_before + 1  # POST is not retried
+
+    def test_breaker_fails_fast_when_server_down(self, fake_server):
+        fake_server.stop()
+        with DevicesAPI(base_url=fake_server.base_url, timeout=1, breaker_threshold=3,
+                        breaker_reset=60) as devices_api:
+            for _ in range(3):
+                with pytest.raises(requests.ConnectionError):
+                    devices_api.get_devices()
+            with pytest.raises(CircuitOpenError):
+                devices_api.get_devices()
+
+        assert devices_api.breaker(fake_server.base_url).state == 'open'
+        assert devices_api.counters['breaker_opened'] == 1
+        assert devices_api.counters['breaker_rejected'] == 1
+
+    def test_trial_error_does_not_wedge_breaker(self, fake_server, monkeypatch):
+        with DevicesAPI(base_url=fake_server.base_url, breaker_threshold=1, breaker_reset=0.05) as devices_api:
+            fake_server.error_rate = 1
+            devices_api.get(devices_api.base_url + 'devices')
+            fake_server.error_rate = 0
+            time.sleep(0.1)
+
+            with monkeypatch.context() as patch:
+                patch.setattr(devices_api, '_send', mock.Mock(side_effect=requests.exceptions.ChunkedEncodingError))
+                with pytest.raises(requests.exceptions.ChunkedEncodingError):
+                    devices_api.get_devices()  # the trial request of the half-open circuit
+
+            assert len(devices_api.get_devices()) == 50
+            assert devices_api.breaker(fake_server.base_url).state == 'closed'
+
+    def test_slow_get_hedged(self, fake_server):
+        with DevicesAPI(base_url=fake_server.base_url, hedge=True, hedge_after=0.05) as devices_api:
+            fake_server.latency = 150
+            devices = devices_api.get_devices()
+
+        assert len(devices) == 50
+        assert devices_api.counters['hedges'] == 1
+        assert fake_server.counters['requests'] == 2
+
+
+class TestHTTPCache(object):
+
+    def test_unchanged_list_revalidated(self, fake_server, fake_api):
+        fake_api.cache = HTTPCache()
+        first = fake_api.get(fake_api.base_url + 'devices')
+        devices = fake_api.get_devices()
+
+        assert first.headers['Content-Encoding'] == 'gzip'
+        assert devices == first.json()
+        assert fake_server.counters['not_modified'] == 1
+        assert fake_api.counters['cache_hits'] == 1
+
+    def test_changes_invalidate_cached_responses(self, fake_server, fake_api):
+        fake_api.cache = HTTPCache()
+        device = fake_api.get_devices()[0]
+        fake_api.get_device_by_id(device['id'])
+
+        fake_api.update_device(Device(id=device['id'], system_name='RENAMED', type=device['type'],
+                                 hdd_capacity=device['hdd_capacity']))
+
+        assert fake_api.get_device_by_id(device['id'])['system_name'] == 'RENAMED'
+        assert fake_api.get_devices()[0]['system_name'] == 'RENAMED'
+        assert fake_server.counters['not_modified'] == 0
+
+    def test_cache_persisted_across_runs(self, fake_server, tmp_path):
+        path = str(tmp_path / 'http-cache.sqlite')
+        with DevicesAPI(base_url=fake_server.base_url) as first_run:
+            first_run.cache = HTTPCache(path=path)
+            devices = first_run.get_devices()
+
+        with DevicesAPI(base_url=fake_server.base_url) as next_run:
+            next_run.cache = HTTPCache(path=path)
+            assert next_run.get_devices() == devices
+        assert fake_server.counters['not_modified'] == 1
+
+
+    def test_persisted_cache_bounded(self, fake_api, tmp_path, monkeypatch):
+        connect = mock.Mock(side_effect=sqlite3.connect)
+        monkeypatch.setattr('api.cache.sqlite3.connect', connect)
+        fake_api.cache = HTTPCache(maxsize=10, path=str(tmp_path / 'http-cache.sqlite'))
+        ids = [d['id'] for d in fake_api.get_devices()]
+
+        assert fake_api.get_devices_by_ids(ids).ok
+        assert fake_api.get_devices_by_ids(ids[-5:]).ok
+
+        assert connect.call_count <= 1 + 2 * fake_api.concurrency  # one per thread, not one per request
+        with sqlite3.connect(fake_api.cache.path) as connection:
+            assert connection.execute('SELECT COUNT(*) FROM responses').fetchone()[0] <= 10
+        assert fake_api.counters['cache_hits'] == 5
+
+
+class TestNamespace(object):
+
+    def test_runs_see_only_own_devices(self, fake_server, fake_api):
+        with DevicesAPI(base_url=fake_server.base_url) as first, DevicesAPI(base_url=fake_server.base_url) as second:
+            for worker, run in zip(['gw0', 'gw1'], (first, second)):
+                run.namespace = Namespace.create('auto', worker)
+                run.add_devices([Device(system_name=run.namespace.name(f'DEVICE-{i}'), type='MAC',
+                                        hdd_capacity='64') for i in range(3)])
+
+            assert first.namespace.prefix != second.namespace.prefix
+            assert len(first.get_devices()) == len(second.get_devices()) == 3
+            assert not set(d['id'] for d in first.get_devices()) & set(d['id'] for d in second.get_devices())
+            assert [d.system_name for d in second.iter_devices()] == [d['system_name'] for d in second.get_devices()]
+        assert len(fake_api.get_devices()) == 56
+
+
+class TestLoad(object):
+
+    def test_server_errors_counted(self):
+        with FakeDevicesServer(devices=5, error_rate=0.3, seed=4) as server, \
+                DevicesAPI(base_url=server.base_url) as devices_api:
+            generator = LoadGenerator(devices_api, rate=100, ramp_up=0, duration=1,
+                                      mix={'get': 1, 'add': 1, 'delete': 1}, workers=10, seed=1)
+            try:
+                steady = generator.run()[-1]
+            finally:
+                generator.cleanup()
+
+        assert steady['requests'] == 100
+        assert steady['error_rate'] > 0.1
+        assert not devices_api.raise_for_status
+
+    def test_nothing_to_pick_falls_back_to_add(self, fake_api):
+        generator = LoadGenerator(fake_api, rate=1, ramp_up=0, duration=0, mix={'update': 1}, seed=1)
+
+        assert generator._operation('update', generator.random_device(), 0.99) == 'add'
+        assert generator._operation('delete', generator.random_device(), 0.99) == 'delete'
+        assert generator.own_ids == [] and len(fake_api.get_devices()) == 50
@@ -1,44 +1,16 @@
 import random
+from dataclasses import replace
 
 import pytest
-import pandas as pd
 from selenium.common.exceptions import NoSuchElementException
 
 from testdata import device_props
-from api.devices import DevicesAPI, Device
-
-from pom.navigator import DevicesUI
-import config
+from testdata.seeding import generate_devices
+from api.devices import Device
+from compare import diff_devices
 import logger
 
-parser = config.parser
-parser.add_argument('--ui-url', help='URL to client app', env_var='UI_URL')
-parser.add_argument('--api-url', help='URL to server app', env_var='API_URL')
-parser.add_argument('--implicit-wait', type=str, default=10,
-                    help='The web driver to wait for a certain amount of time '
-                         'before it throws a "No Such Element Exception". Default: %(default)s',
-                    env_var='IMP_WAIT')
-
-cfg, _ = parser.parse_known_args()
-
-log = logger.get_logger(__name__, cfg.log_level)
-log.info(cfg)
-
-api = DevicesAPI(base_url=cfg.api_url)
-ui = DevicesUI(browser='Chrome', url=cfg.ui_url, implicit_wait=cfg.implicit_wait)
-
-
-def dataframe_difference(df1: pd.DataFrame, df2: pd.DataFrame) -> pd.DataFrame:
-    """
-    Find rows which are different between two DataFrames.
-
-    :param df1: first dataframe.
-    :param df2: second dataframe.
-    :return:    if there is different between both dataframes.
-    """
-    comparison_df = df1.merge(df2, indicator=True, how='outer')
-    diff_df = comparison_df[comparison_df['_merge'] != 'both']
-    return diff_df
+log = logger.get_logger(__name__)
 
 
 class TestDevices(object):
@@ -59,69 +31,67 @@ class TestDevices(object):
         # here you should report test results to test case management system for reporting historical purposes.
         pass
 
-    expected_devices = api.get_devices()  # get the list of devices returned from API
-    log.debug(f'{len(expected_devices)} devices from API')
+    @pytest.fixture(scope='class')
+    def expected_devices(self, api) -> list:
+        devices = api.get_devices()  # get the list of devices returned from API
+        log.debug('%s devices from API', len(devices))
+        return devices
 
-    actual_devices = ui.get_devices_list()  # get the list of devices from UI to compare further
+    @pytest.fixture(scope='class')
+    def actual_devices(self, ui) -> list:
+        return ui.get_devices_list()  # get the list of devices from UI to compare further
 
-    @pytest.mark.parametrize('name', [d['system_name'] for d in expected_devices],
-                             ids=[d['system_name'] for d in expected_devices])
-    def test_each_device_displayed_alpha(self, name: str):
+    def test_each_device_displayed_alpha(self, ui, expected_devices):
         """
         This test literally searches for an element in UI for each device by name.
-        :param name:
+        :param expected_devices:
         :return:
         """
-        device = ui.get_device_by_name(name)
-        assert device.is_displayed()
+        not_displayed = []
+        for name in [d['system_name'] for d in expected_devices]:
+            try:
+                if not ui.get_device_by_name(name).is_displayed():
+                    not_displayed.append(name)
+            except NoSuchElementException:
+                not_displayed.append(name)
 
-    @pytest.mark.parametrize('device', actual_devices,
-                             ids=[d['system_name'] for d in actual_devices])
-    def test_each_device_displayed_beta(self, device: dict):
+        assert not not_displayed, f'Devices are not displayed: {not_displayed}'
+
+    def test_each_device_displayed_beta(self, actual_devices):
         """
         The test iterates over the list of devices read from UI and check displayed value.
-        :param device
+        :param actual_devices:
         :return:
         """
-        assert device['displayed']
+        failed = [d['system_name'] for d in actual_devices if not d['displayed']]
+        assert not failed, f'Devices are not displayed: {failed}'
 
-    @pytest.mark.parametrize('device', actual_devices,
-                             ids=[d['system_name'] for d in actual_devices])
-    def test_each_device_has_edit(self, device: dict):
-        assert device['edit']
+    def test_each_device_has_edit(self, actual_devices):
+        failed = [d['system_name'] for d in actual_devices if not d['edit']]
+        assert not failed, f'Devices without edit: {failed}'
 
-    @pytest.mark.parametrize('device', actual_devices,
-                             ids=[d['system_name'] for d in actual_devices])
-    def test_each_device_has_remove(self, device: dict):
-        assert device['remove']
+    def test_each_device_has_remove(self, actual_devices):
+        failed = [d['system_name'] for d in actual_devices if not d['remove']]
+        assert not failed, f'Devices without remove: {failed}'
 
-    def test_devices(self):
+    def test_devices(self, expected_devices, actual_devices):
         """
         The test expected the lists of devices from API and from UI are to be identical.
         :return:
         """
-        expected = pd.DataFrame(self.expected_devices)  # convert list of dict to pandas dataframe
-        actual = pd.DataFrame(self.actual_devices)
-        actual.drop(labels=['edit', 'remove', 'displayed'], axis=1, inplace=True)  # remove excessive columns
-
-        diff = dataframe_difference(expected, actual)  # do outer merge with mark what is one side only
-        result = len(diff) == 0
-        assert result, diff
+        diff = diff_devices(expected_devices, actual_devices)  # keyed by id, UI only fields are ignored
+        assert diff.ok, diff
 
-    def test_devices_fail_on_purpose(self):
+    def test_devices_fail_on_purpose(self, expected_devices, actual_devices):
         """
         This test purposely fails with one extra element in "expected devices".
         This would happen if UI did not display one or more devices.
         :return:
         """
-        self.expected_devices.append({'id': 'abc', 'system_name': 'olalala', 'type': 'oy', 'hdd_capacity': '123'})
-        expected = pd.DataFrame(self.expected_devices)
-        actual = pd.DataFrame(self.actual_devices)
-        actual.drop(labels=['edit', 'remove', 'displayed'], axis=1, inplace=True)
-
-        diff = dataframe_difference(expected, actual)
-        result = len(diff) == 0
-        assert result, diff
+        expected_devices = expected_devices + [{'id': 'abc', 'system_name': 'olalala', 'type': 'oy',
+                                                'hdd_capacity': '123'}]
+        diff = diff_devices(expected_devices, actual_devices)
+        assert diff.ok, diff
 
 
 class TestAddDevice(object):
@@ -130,77 +100,81 @@ class TestAddDevice(object):
     Verify the new device is now visible. Check name, type and capacity are visible and correctly displayed to the user.
 
     Since system_name is not unique system-wide we may have more than one element with the same name in UI.
-    When a new device created, UI does not return its unique id. One of the ways to intercept http response and get the
-    exact id of the new added device is to run MITM proxy. This can be done with python and Selenium,
-    but will take longer time to implement.
+    When a new device created, UI does not return its unique id, so it is taken from the HTTP response
+    to the app request recorded with Chrome DevTools (pom.network.NetworkCapture).
 
     """
 
     @pytest.fixture(scope='class')
-    def add_device_via_ui(self) -> dict:
-        new_device = {'system_name': random.choice(device_props.first_names).upper() + '-' +
-                                     random.choice(device_props.size_matters).upper() + '-' +
-                                     random.choice(device_props.platforms).upper(),
+    def add_device_via_ui(self, api, ui, ledger) -> dict:
+        """
+        Add a device via UI. The id assigned by the server is captured from the POST request made by the app,
+        the device is deleted via API after the test class.
+        """
+        new_device = {'system_name': api.namespace.name(random.choice(device_props.first_names).upper() + '-' +
+                                                        random.choice(device_props.size_matters).upper() + '-' +
+                                                        random.choice(device_props.platforms).upper()),
                       'device_type': random.choice(device_props.device_types),
                       'hdd_capacity': str(2 ** random.randint(7, 12))
                       }
 
         try:
-            ui.add_device(**new_device)
-            log.info(f'Added new device: {new_device}')
-            return new_device
+            device_id = ui.add_device(**new_device, keystrokes=True)  # typed like a user
+            ledger.add([device_id])  # the session cleanup deletes it if the run is interrupted
+            log.info('Added new device %s: %s', device_id, new_device)
 
-        except Exception as e:
-            log.error(f'Could not add a device via UI: {new_device}')
-            log.exception(e)
+        except Exception:
+            log.exception('Could not add a device via UI: %s', new_device)
             raise
 
-    @classmethod
-    def teardown_class(cls):
-        """
-        Here I should delete the added device via API to return the system to the previous state.
-        :return:
-        """
-        # device_id = %placeholder%
-        # cls.api.delete_device(device_id)
-        pass
+        yield {'id': device_id, **new_device}
+
+        if device_id is not None:
+            api.delete_device(device_id)
+            ledger.discard([device_id])
 
-    def test_new_device_api(self, add_device_via_ui):
+    def test_new_device_api(self, api, add_device_via_ui):
         """
-        Read the created device from API
+        Read the created device from API by the captured id.
+        Falls back to the first device with matching name if the id was not captured.
         :param add_device_via_ui:
         :return:
         """
-        expected_device = add_device_via_ui
-        log.info(f'Looking for the device in API: {expected_device}')
-
-        # this place is not correct intentionally
-        # take only the first device from UI with matching name.
-        # all others will be ignored.
-        # to do it right way, have to intercept id of the created device in HTTP response
-        actual_devices = api.get_device_by_name(expected_device['system_name'])
-        log.info('Devices found with system name \'{}\':\n {}'.format(expected_device['system_name'], actual_devices))
-        actual_device = actual_devices[0]
+        expected_device = dict(add_device_via_ui)
+        device_id = expected_device.pop('id')
+        log.info('Looking for the device %s in API: %s', device_id, expected_device)
+
+        if device_id is not None:
+            actual_device = api.get_device_by_id(device_id)
+        else:
+            actual_devices = api.get_device_by_name(expected_device['system_name'])
+            log.info('Devices found with system name %r:\n %s', expected_device['system_name'], actual_devices)
+            actual_device = actual_devices[0]
         actual_device.pop('id')
         actual_device['device_type'] = actual_device.pop('type')
 
         assert actual_device == expected_device
 
-    def test_new_device_ui(self, add_device_via_ui):
+    def test_new_device_ui(self, ui, add_device_via_ui):
         """
-        Read the created device from UI. The device is searched by name which may cause ambiguous recognition.
+        Read the created device from UI by the captured id. Without id the device is searched by name
+        which may cause ambiguous recognition.
         :param add_device_via_ui:
         :return:
         """
-        expected_device = add_device_via_ui
-        log.info(f'Looking for the device in UI: {expected_device}')
+        expected_device = dict(add_device_via_ui)
+        device_id = expected_device.pop('id')
+        log.info('Looking for the device in UI: %s', expected_device)
 
         # # reread the list of devices from UI
         # actual_devices = self.ui.get_devices_list()
         # # since we go by name, let's take just the first one. later it is bette to switch to id.
         # actual_device = [d for d in actual_devices if d['system_name'] == expected_device['system_name']][0]
 
-        actual_device = ui.get_device_details(ui.get_device_by_name(expected_device['system_name']))
+        if device_id is not None:
+            actual_device = ui.get_device_details(ui.get_device_by_id(device_id))
+        else:
+            actual_device = ui.get_device_details(ui.get_device_by_name(expected_device['system_name']))
 
         # drop and rename the keys to match dict structure
         drop_keys = ['displayed', 'id', 'remove', 'edit']
@@ -210,8 +184,42 @@ class TestAddDevice(object):
 
         assert actual_device == expected_device
 
-    def test_new_device_visible(self, add_device_via_ui):
-        assert ui.get_device_details(ui.get_device_by_name(add_device_via_ui['system_name']))['displayed']
+    def test_new_device_visible(self, ui, add_device_via_ui):
+        if add_device_via_ui['id'] is not None:
+            device = ui.get_device_by_id(add_device_via_ui['id'])
+        else:
+            device = ui.get_device_by_name(add_device_via_ui['system_name'])
+        assert ui.get_device_details(device)['displayed']
+
+
+class TestAddDevices(object):
+    """
+    Verify that a batch of devices created with the UI form filled by script is saved as entered.
+    """
+
+    @pytest.fixture(scope='class')
+    def add_devices_via_ui(self, api, ui, ledger) -> list:
+        devices = generate_devices(5, seed=random.randint(0, 10 ** 6), prefix=api.namespace.prefix)
+        device_ids = ui.add_devices(devices)
+        ledger.add(device_ids)
+
+        yield list(zip(device_ids, devices))
+
+        api.delete_devices([device_id for device_id in device_ids if device_id is not None])
+        ledger.discard(device_ids)
+
+    def test_new_devices_api(self, api, add_devices_via_ui):
+        for device_id, device in add_devices_via_ui:
+            assert device_id is not None, f'Id of {device.system_name} was not captured'
+            actual_device = api.get_device_by_id(device_id)
+            assert Device(**actual_device) == replace(device, id=device_id)
+
+    def test_new_devices_ui(self, ui, add_devices_via_ui):
+        shown = {d['id']: d for d in ui.get_devices_list()}
+        for device_id, device in add_devices_via_ui:
+            assert shown[device_id]['system_name'] == device.system_name
+            assert shown[device_id]['type'] == device.type
+            assert shown[device_id]['hdd_capacity'] == device.hdd_capacity
 
 
 class TestRenameDevice(object):
@@ -221,31 +229,32 @@ class TestRenameDevice(object):
     """
 
     @pytest.fixture
-    def rename_the_first_one(self):
-        first_one = api.get_devices()[0]
+    def rename_the_first_one(self, api, ui):
+        first_one = api.get_devices()[0]  # the first one of the namespace when the run is isolated
         name_before = first_one['system_name']
-        name_after = name_before[::-1]
+        name_after = api.namespace.name(api.namespace.strip(name_before)[::-1])
         api.update_device(Device(id=first_one['id'],
                                  system_name=name_after,
                                  type=first_one['type'],
                                  hdd_capacity=first_one['hdd_capacity']
                                  ))
-        ui.driver.refresh()  # reload UI after API call
+        ui.refresh()  # reload UI after API call and wait for the list to be rendered
 
         return name_before, name_after
 
-    def test_old_name_not_presented(self, rename_the_first_one):
+    def test_old_name_not_presented(self, ui, rename_the_first_one):
         name_before, _ = rename_the_first_one
-        log.info(f'Search for the device and make sure it is not displayed: {name_before}')
+        log.info('Search for the device and make sure it is not displayed: %s', name_before)
 
-        with pytest.raises(NoSuchElementException):
-            ui.get_device_by_name(name_before).is_displayed()
+        # the page snapshot pulls only rows changed since the last sync and answers the lookup locally
+        assert not ui.snapshot.sync().find_by_name(name_before)
 
-    def test_new_name_is_presented(self, rename_the_first_one):
+    def test_new_name_is_presented(self, ui, rename_the_first_one):
         _, name_after = rename_the_first_one
-        log.info(f'Search for the device and make sure it is displayed: {name_after}')
+        log.info('Search for the device and make sure it is displayed: %s', name_after)
 
-        assert ui.get_device_by_name(name_after).is_displayed()
+        devices = ui.snapshot.sync().find_by_name(name_after)
+        assert devices and devices[0]['displayed']
 
 
 class TestDeleteDevice(object):
@@ -255,17 +264,17 @@ class TestDeleteDevice(object):
     """
 
     @pytest.fixture
-    def delete_the_last_one(self):
+    def delete_the_last_one(self, api, ui, ledger):
         device = api.get_devices()[-1]
         api.delete_device(device['id'])
+        ledger.discard([device['id']])
 
-        ui.driver.refresh()
+        ui.refresh()
 
         return device
 
-    def test_deleted_one_not_presented_in_ui(self, delete_the_last_one):
+    def test_deleted_one_not_presented_in_ui(self, ui, delete_the_last_one):
         """
-        Verifies NoSuchElementException raises for the deleted device
+        Verifies there is no row of the deleted device in the page
         """
-        with pytest.raises(NoSuchElementException):
-            ui.get_device_by_id(delete_the_last_one['id']).is_displayed()
+        assert ui.snapshot.sync().find_by_id(delete_the_last_one['id']) is None
@@ -0,0 +1,69 @@
+import json
+
+from api.devices import Device
+from pom.navigator import _ids_by_name
+from pom.network import Exchange, NetworkCapture
+from pom.perf import PERF_COLLECT_JS, PerfRecorder
+
+
+class RemoteStub(object):
+    """
+    Commands of webdriver.Remote used by the capture, there is no get_log.
+    """
+
+    def __init__(self, events: list):
+        self.events = events
+
+    def execute(self, command: str, params: dict) -> dict:
+        assert (command, params) == ('getLog', {'type': 'performance'})
+        events, self.events = self.events, []
+        return {'value': [{'message': json.dumps({'message': event})} for event in events]}
+
+    def execute_cdp_cmd(self, cmd: str, cmd_args: dict) -> dict:
+        return {'body': '{"id": "1"}'} if cmd == 'Network.getResponseBody' else {}
+
+
+class TestNetworkCapture(object):
+
+    def test_capture_without_get_log(self):
+        driver = RemoteStub([{'method': 'Network.requestWillBeSent', 'params': {'requestId': 'old', 'type': 'XHR',
+                                                                                'request': {'method': 'GET',
+                                                                                            'url': '/devices'}}}])
+        capture = NetworkCapture(driver).start()
+        driver.events = [
+            {'method': 'Network.requestWillBeSent',
+             'params': {'requestId': 'r1', 'type': 'XHR', 'request': {'method': 'POST', 'url': 'http://x/devices',
+                                                                      'postData': '{"system_name": "A"}'}}},
+            {'method': 'Network.responseReceived', 'params': {'requestId': 'r1', 'response': {'status': 200}}},
+            {'method': 'Network.loadingFinished', 'params': {'requestId': 'r1'}},
+        ]
+
+        exchange = capture.wait_for('POST', 'devices', timeout=1)
+        assert (exchange.status, exchange.json()) == (200, {'id': '1'})
+        assert [e.request_id for e in capture.exchanges.values()] == ['r1']
+
+    def test_added_ids_matched_by_name(self):
+        def post(name, device_id):
+            return Exchange(request_id=name, method='POST', url='http://x/devices', finished=True,
+                            request_body=json.dumps({'system_name': name}),
+                            response_body=json.dumps({'id': device_id, 'system_name': name}))
+
+        devices = [Device(system_name=name, type='MAC', hdd_capacity='64') for name in ('A', 'B', 'C')]
+        # the submit of A was blocked, C was answered before B
+        exchanges = [post('C', '3'), post('B', '2'), Exchange('x', 'POST', 'http://x/devices', finished=True)]
+
+        assert _ids_by_name(exchanges, devices) == [None, '2', '3']
+
+    def test_perf_measured_without_devtools(self, tmp_path):
+        class ScriptOnlyStub(object):
+            def execute_script(self, script, *args):
+                if script == PERF_COLLECT_JS:
+                    return {'start': 0, 'rows': [[5, 3]], 'long_tasks': [], 'navigated': False, 'rows_now': 3,
+                            'navigation': None, 'resources': [], 'heap': None}
+
+        recorder = PerfRecorder(path=str(tmp_path / 'perf.jsonl'), run_id='RUN')
+        with recorder.measure(ScriptOnlyStub(), 'open_ui'):
+            pass
+
+        with open(recorder.path) as perf_file:
+            assert json.loads(perf_file.read())['rows_rendered_ms'] == 5
@@ -0,0 +1,39 @@
+import json
+
+from selenium.common.exceptions import NoSuchElementException
+
+from plugins.profiler import TraceProfiler, _busy
+
+
+class TestProfiler(object):
+
+    def test_busy_time_counts_overlaps_once(self):
+        assert _busy([(0, 2), (1, 3), (5, 6)]) == 4
+        assert _busy([]) == 0
+
+    def test_breakdown_by_category(self, pytestconfig, tmp_path):
+        profiler = TraceProfiler(pytestconfig, str(tmp_path / 'trace.json'))
+        profiler.add_span('api', 'GET /devices', 10.0, 1.0)
+        profiler.add_span('api', 'GET /devices/{id}', 10.5, 1.0)
+        profiler.add_span('webdriver', 'click', 12.0, 0.5)
+        profiler.add_span('wait', 'find', 13.0, 2.0)
+
+        breakdown = profiler.breakdown(0, 10.0, 20.0)
+        assert breakdown == {'api_ms': 1500, 'webdriver_ms': 500, 'wait_ms': 2000, 'local_ms': 6000}
+
+    def test_requests_and_driver_commands_traced(self, pytestconfig, tmp_path, fake_api):
+        profiler = TraceProfiler(pytestconfig, str(tmp_path / 'trace.json'))
+        profiler.register()
+        try:
+            fake_api.get_devices_by_ids([d['id'] for d in fake_api.get_devices()][:3])
+        finally:
+            profiler.unregister()
+        profiler.listener.before_find('css selector', '.missing', None)
+        profiler.listener.on_exception(NoSuchElementException(), None)
+
+        with open(profiler.save()) as trace_file:
+            events = json.load(trace_file)['traceEvents']
+        spans = [(e['cat'], e['name']) for e in events if e['ph'] == 'X']
+        assert spans.count(('api', 'GET /devices/{id}')) == 3
+        assert ('api', 'GET /devices') in spans
+        assert ('wait', 'find') in spans
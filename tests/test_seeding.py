@@ -0,0 +1,44 @@
+from testdata.seeding import DeviceLedger, generate_devices, seed_devices
+
+
+class TestSeeding(object):
+
+    def test_generator_deterministic_and_unique(self):
+        devices = generate_devices(1000, seed=7)
+
+        assert devices == generate_devices(1000, seed=7)
+        assert devices != generate_devices(1000, seed=8)
+        assert len({d.system_name for d in devices}) == 1000
+
+    def test_seed_and_cleanup(self, fake_api):
+        ledger = DeviceLedger()
+        created = seed_devices(fake_api, generate_devices(250, seed=1), ledger, batch_size=100)
+
+        assert len(created) == len(ledger) == 250
+        assert len(fake_api.get_devices()) == 50 + 250
+
+        assert ledger.cleanup(fake_api) == []
+        assert len(ledger) == 0
+        assert len(fake_api.get_devices()) == 50
+
+    def test_interrupted_run_cleaned_up_by_next_one(self, fake_api, tmp_path):
+        path = str(tmp_path / 'ledger.jsonl')
+        created = seed_devices(fake_api, generate_devices(20, seed=1), DeviceLedger(path))
+        DeviceLedger(path).discard([created[0]['id']])
+
+        next_run = DeviceLedger(path)
+        assert len(next_run) == 19
+        next_run.cleanup(fake_api)
+
+        assert len(DeviceLedger(path)) == 0
+        assert len(fake_api.get_devices()) == 50 + 1
+
+    def test_failed_deletes_stay_in_ledger(self, fake_api):
+        ledger = DeviceLedger()
+        created = seed_devices(fake_api, generate_devices(3, seed=1), ledger)
+        ledger.add(['missing'])
+
+        assert ledger.cleanup(fake_api) == ['missing']
+        assert ledger.ids == ['missing']
+        assert not fake_api.raise_for_status
+        assert all(device['id'] for device in created)
@@ -0,0 +1,42 @@
+import json
+import os
+import socket
+
+import pytest
+
+from pom.service import BrowserService
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class TestBrowserService(object):
+
+    def test_stale_state_is_not_running(self, tmp_path):
+        state_file = tmp_path / 'service.json'
+        assert BrowserService.running(str(state_file)) is None
+
+        state_file.write_text(json.dumps({'pid': 1, 'port': _free_port(), 'debug_port': _free_port()}))
+        assert BrowserService.running(str(state_file)) is None
+
+    def test_only_attached_session_frees_chrome(self, tmp_path):
+        service = BrowserService(state_file=str(tmp_path / 'service.json'))
+        assert service._attach_lock.acquire(blocking=False)
+        service._attached_session = 'attached'
+
+        service.release('other')
+        assert service._attach_lock.locked()
+        service.release('attached')
+        assert not service._attach_lock.locked()
+
+    def test_one_process_starts_the_service(self, tmp_path, monkeypatch):
+        state_file = str(tmp_path / 'service.json')
+        open(state_file + '.lock', 'w').close()  # another worker is starting the service
+        monkeypatch.setattr('subprocess.Popen', lambda *args, **kwargs: pytest.fail('started twice'))
+
+        with pytest.raises(TimeoutError):
+            BrowserService.ensure(state_file=state_file, timeout=0.5)
+        assert os.path.exists(state_file + '.lock')
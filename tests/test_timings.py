@@ -0,0 +1,66 @@
+import os
+import subprocess
+import sys
+import time
+
+from api import RequestTiming
+from db import TimingRecorder
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _timing(template: str, elapsed: float, status: int = 200) -> RequestTiming:
+    return RequestTiming(method='GET', url='http://x' + template, template=template, status=status, nbytes=0,
+                         elapsed=elapsed, started=time.time())
+
+
+class TestTimingRecorder(object):
+
+    def test_batches_flushed_on_close(self, fake_api, tmp_path):
+        path = str(tmp_path / 'timings.sqlite')
+        recorder = TimingRecorder(path=path, run_id='RUN', batch_size=10, flush_interval=60)
+        fake_api.recorder = recorder
+        fake_api.get_devices_by_ids([d['id'] for d in fake_api.get_devices()][:24])
+
+        started = time.monotonic()
+        recorder.close()  # the partial batch is written at once, not after flush_interval
+        assert time.monotonic() - started < 5
+
+        report = TimingRecorder(path=path, read_only=True)
+        assert report.runs()[0]['run_id'] == 'RUN' and report.runs()[0]['count'] == 25
+        assert {(s['template'], s['count']) for s in report.percentiles('RUN')} == {('/devices', 1),
+                                                                                   ('/devices/{id}', 24)}
+
+    def test_percentiles_and_comparison(self, tmp_path):
+        path = str(tmp_path / 'timings.sqlite')
+        with TimingRecorder(path=path, run_id='BASE') as base:
+            for ms in range(1, 101):
+                base.record(_timing('/devices', ms / 1000, 500 if ms % 10 == 0 else 200))
+        with TimingRecorder(path=path, run_id='CURRENT') as current:
+            for ms in range(1, 101):
+                current.record(_timing('/devices', 2 * ms / 1000))
+            current.record(_timing('/health', 0.001))
+
+        stats, = TimingRecorder(path=path, read_only=True).percentiles('BASE')
+        assert (stats['count'], stats['errors']) == (100, 10)
+        assert (stats['p50'], stats['p95'], stats['p99']) == (0.05, 0.095, 0.099)
+
+        comparison = current.compare_runs('BASE')
+        assert comparison[0] == {'method': 'GET', 'template': '/devices', 'base': 0.095, 'current': 0.19,
+                                 'ratio': 2.0}
+        assert comparison[1]['base'] is None and comparison[1]['ratio'] is None
+
+    def test_cli(self, tmp_path):
+        path = str(tmp_path / 'timings.sqlite')
+        with TimingRecorder(path=path, run_id='BASE') as recorder:
+            recorder.record(_timing('/devices', 0.01))
+
+        listed = subprocess.run([sys.executable, '-m', 'db', '--timings-db', path, '--runs'],
+                                capture_output=True, text=True, cwd=REPO_ROOT)
+        assert listed.returncode == 0 and 'BASE' in listed.stdout
+
+        missing = tmp_path / 'missing.sqlite'
+        result = subprocess.run([sys.executable, '-m', 'db', '--timings-db', str(missing)],
+                                capture_output=True, text=True, cwd=REPO_ROOT)
+        assert result.returncode == 1 and 'No timings database' in result.stderr
+        assert not missing.exists()
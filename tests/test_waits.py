@@ -0,0 +1,27 @@
+import time
+
+from pom.waits import Waits
+
+
+class DriverStub(object):
+
+    def __init__(self, rows: list):
+        self.rows = rows
+
+    def find_elements(self, by, value):
+        return self.rows
+
+
+class TestWaits(object):
+
+    def test_empty_list_settles(self):
+        waits = Waits(DriverStub([]), timeout=5, poll=0.05)
+        started = time.monotonic()
+
+        assert waits.rows_settled({'by': 'css selector', 'value': '.row'}, empty_settle=0.2) == 0
+        assert time.monotonic() - started < 1
+
+    def test_rows_settle(self):
+        waits = Waits(DriverStub(['row'] * 3), timeout=5, poll=0.05)
+
+        assert waits.rows_settled({'by': 'css selector', 'value': '.row'}, settle=0.1) == 3